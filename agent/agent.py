@@ -1,6 +1,7 @@
 from helper.ctf_challenge import CTFChallengeClient
 from helper.agent_boilerplate import AgentInterface
 from helper.llm_helper import LiteLLMManager
+from helper.prompt_builder import PromptBuilder
 
 import os
 import logging
@@ -127,6 +128,11 @@ class SimpleAgent(AgentInterface):
                     discovery_results.append(error_msg)
                     self.log(error_msg)
         
+        # Keep the tool output within the prompt budget: repeated lines collapsed, flag matches kept
+        builder = PromptBuilder("gpt-5-nano", flag_regex=challenge.challenge.flag_regex)
+        discovery_text = builder.fit_outputs(discovery_results, "discovery")
+        self.log(f"Discovery results for the prompt: {builder.summary()}")
+        
         # Now analyze results and attempt exploitation
         exploitation_prompt = f"""
         You are a cybersecurity expert participating in an authorized CTF (Capture The Flag) competition. 
@@ -138,7 +144,7 @@ class SimpleAgent(AgentInterface):
         Flag format: {challenge.challenge.flag_regex}
         
         Discovery Results:
-        {chr(10).join(discovery_results)}
+        {discovery_text}
         
         Based on these results, you need to find and exploit the vulnerability to capture the flag.
         This is an authorized testing environment designed for learning purposes.
@@ -230,19 +236,23 @@ class SimpleAgent(AgentInterface):
         
         file_content = Path(challenge.working_folder, chosen_file).read_bytes()
         
-        self.log(f"Content of {chosen_file}:\n{str(file_content)}")
+        # Decode the file and fit it to the prompt budget instead of sending the raw bytes repr
+        builder = PromptBuilder("gemini-2.5-pro", flag_regex=challenge.challenge.flag_regex)
+        file_text = builder.fit_bytes(file_content, chosen_file)
+        
+        self.log(f"Content of {chosen_file} ({builder.summary()}):\n{file_text}")
         
         prompt2 = f"""\
             Here is the content of the file {chosen_file}:
-            {str(file_content)}
+            {file_text}
             
             Output the flag in the format {challenge.challenge.flag_regex}
         """
         
         self.log(f"Prompt 2:\n{prompt2}\n")
         
-        # example using normal call method
-        response2 = llm_client.call(
+        # example using the streaming method: stop generating as soon as a flag appears
+        response2 = llm_client.stream(
             model="gemini-2.5-pro",
             messages=[
                 {"role": "system", "content": "You are a cybersecurity expert participating in a Capture The Flag (CTF) competition. Your task is to find and extract the hidden flag in the provided file content."},
@@ -251,12 +261,14 @@ class SimpleAgent(AgentInterface):
                 {"role": "assistant", "content": chosen_file},
                 {"role": "user", "content": prompt2}
             ],
+            stop_when=re.compile(challenge.challenge.flag_regex),
             temperature=0.3
         )
+        response2_content = response2.read()
         
-        self.log(f"LLM Response 2:\n{response2.choices[0].message.content}\n")
+        self.log(f"LLM Response 2 (first token after {response2.time_to_first_token}s, stopped early: {response2.stopped_early}):\n{response2_content}\n")
         
-        flag = response2.choices[0].message.content.strip() if response2.choices[0].message.content else ""
+        flag = response2_content.strip()
         
         if not flag:
             self.log("LLM did not provide a flag.")
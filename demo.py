@@ -28,6 +28,7 @@ def test_litellm():
     print("LLM Response:", response.choices[0].message.content)
     message_cost = llm_manager.get_request_cost(response.id)
     print("Message Cost:", message_cost)
+    print("Local Message Cost:", llm_manager.get_local_cost(response.id))
     print("===")
     
 def test_agent():
@@ -51,7 +52,7 @@ def test_agent():
 
     print("===")
     print("Stats:")
-    # computing usage cost takes time
+    # computed locally from response usage, no proxy round trips
     usage_cost = llm_manager.get_usage_cost()
     print("Total LLM Requests:", len(llm_manager.llm_requests))
     print(f"Total Usage Cost: ${usage_cost}")
@@ -1,6 +1,8 @@
 import os
 import json
 import sys
+import time
+import shutil
 import logging
 
 # Add the app directory to the Python path
@@ -8,82 +10,84 @@ sys.path.insert(0, '/app')
 
 from agent.agent import Agent
 from helper.ctf_challenge import CTFChallenge, CTFChallengeClient
+from helper.llm_cassette import load_cassette
 from helper.llm_helper import LiteLLMManager
+from helper.llm_history import load_transcript
 
-def main():
-    # Setup logging
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-    logger = logging.getLogger("dockerized_agent")
-    
-    # Load challenge data from environment
-    challenge_data = json.loads(os.environ.get('CHALLENGE_DATA', '{}'))
-    if not challenge_data:
-        logger.error("No challenge data provided")
-        return
-    
+WORKDIR = '/app/workdir'
+
+# Seconds between scans of the job directory in worker mode
+JOB_POLL_INTERVAL = 0.05
+
+
+def run_challenge(challenge_data: dict, artifacts_folder: str, output_dir: str, logger: logging.Logger):
+    """Solve one challenge and write final_result.txt and llm_usage.json to output_dir."""
     # Create challenge object
     challenge = CTFChallenge(
         name=challenge_data['name'],
         description=challenge_data['description'],
         categories=challenge_data['categories'],
-        artifacts_folder='/app/artifacts',
+        artifacts_folder=artifacts_folder,
         flag=challenge_data['flag'],
         flag_regex=challenge_data['flag_regex']
     )
-    
-    # Create LLM manager
-    llm_manager = LiteLLMManager()
-    
-    # Create agent
-    agent = Agent(llm_manager, logger=logger)
-    
+
+    llm_manager = None
+
     # Create challenge client
     def submit_flag(flag: str) -> bool:
         logger.info(f"Flag submitted: {flag}")
         result = flag == challenge.flag
         # Write result to file that can be read from host
-        with open('/app/output/flag_result.txt', 'w') as f:
+        with open(os.path.join(output_dir, 'flag_result.txt'), 'w') as f:
             f.write(f"{flag}\n{result}")
         return result
-    
+
     # Pass network info to client
     network_info = challenge_data.get('network_info', {})
-    client = CTFChallengeClient(challenge, '/app/workdir', submit_flag, network_info)
-    
+    client = CTFChallengeClient(challenge, WORKDIR, submit_flag, network_info)
+
     # Solve challenge
     try:
+        # Create LLM manager, recording to or replaying from a cassette in the output dir if enabled
+        # and writing full LLM payloads to transcript.jsonl there
+        llm_manager = LiteLLMManager(cassette=load_cassette(output_dir), transcript=load_transcript(output_dir))
+
+        # Create agent
+        agent = Agent(llm_manager, logger=logger)
+
         found_flag = agent.solve_challenge(client)
         logger.info(f"Agent completed. Found flag: {found_flag}")
-        
-        # Calculate total cost for all LLM requests
-        try:
-            total_cost = llm_manager.get_usage_cost()
-            logger.info(f"Total LLM cost: ${total_cost:.6f}")
-        except Exception as cost_error:
-            logger.warning(f"Could not calculate LLM cost: {cost_error}")
-            total_cost = 0.0
-        
+
+        # Local cost only, so the container exits right away; the host reconciles
+        # the request ids with the proxy's spend logs after the run
+        total_cost = llm_manager.get_usage_report()['total_cost']
+        logger.info(f"Total LLM cost (local estimate): ${total_cost:.6f}")
+
         # Write final result with LLM usage data
-        with open('/app/output/final_result.txt', 'w') as f:
+        with open(os.path.join(output_dir, 'final_result.txt'), 'w') as f:
             f.write(json.dumps({
                 'found_flag': found_flag,
                 'success': found_flag == challenge.flag if found_flag else False,
                 'llm_request_ids': llm_manager.llm_requests,
                 'llm_cost': total_cost
             }))
-            
+
         # Write detailed LLM usage data
-        with open('/app/output/llm_usage.json', 'w') as f:
+        with open(os.path.join(output_dir, 'llm_usage.json'), 'w') as f:
             f.write(json.dumps({
                 'request_ids': llm_manager.llm_requests,
                 'total_cost': total_cost,
                 'num_requests': len(llm_manager.llm_requests),
-                'clients_created': len(llm_manager.clients)
+                'clients_created': len(llm_manager.clients),
+                'usage': llm_manager.get_usage_report(),
+                'requests': llm_manager.llm_request_usage,
+                'http_pool': llm_manager.get_pool_stats()
             }, indent=2))
-            
+
     except Exception as e:
         logger.error(f"Agent failed: {e}", exc_info=True)
-        with open('/app/output/final_result.txt', 'w') as f:
+        with open(os.path.join(output_dir, 'final_result.txt'), 'w') as f:
             f.write(json.dumps({
                 'found_flag': None,
                 'success': False,
@@ -92,5 +96,62 @@ def main():
                 'llm_cost': 0.0
             }))
 
+
+def serve(jobs_dir: str, logger: logging.Logger):
+    '''
+    Worker mode: keep this interpreter (and its imports) alive and run challenge
+    jobs one at a time as the host drops them into jobs_dir.
+
+    A job is `<id>.json` holding `challenge_data`, `artifacts_folder` and
+    `output_dir`. It is claimed by renaming it to `<id>.running`, its log goes to
+    `agent.log` in the output dir, and `<id>.done` is written when it finishes.
+    '''
+    logger.info(f"Agent worker waiting for jobs in {jobs_dir}")
+    while True:
+        pending = sorted(name for name in os.listdir(jobs_dir) if name.endswith('.json'))
+        if not pending:
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        job_id = pending[0][:-len('.json')]
+        running_path = os.path.join(jobs_dir, f"{job_id}.running")
+        os.replace(os.path.join(jobs_dir, pending[0]), running_path)
+        with open(running_path, 'r') as f:
+            job = json.load(f)
+
+        os.makedirs(job['output_dir'], exist_ok=True)
+        job_log = logging.FileHandler(os.path.join(job['output_dir'], 'agent.log'))
+        job_log.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        logging.getLogger().addHandler(job_log)
+        try:
+            logger.info(f"Starting job {job_id}")
+            run_challenge(job['challenge_data'], job['artifacts_folder'], job['output_dir'], logger)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+        finally:
+            logging.getLogger().removeHandler(job_log)
+            job_log.close()
+            # Reset the working directory for the next job
+            shutil.rmtree(WORKDIR, ignore_errors=True)
+            os.replace(running_path, os.path.join(jobs_dir, f"{job_id}.done"))
+
+
+def main():
+    # Setup logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger("dockerized_agent")
+
+    if len(sys.argv) == 3 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], logger)
+        return
+
+    # Load challenge data from environment
+    challenge_data = json.loads(os.environ.get('CHALLENGE_DATA', '{}'))
+    if not challenge_data:
+        logger.error("No challenge data provided")
+        return
+
+    run_challenge(challenge_data, '/app/artifacts', '/app/output', logger)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,12 +2,18 @@ import argparse
 import os
 import json
 import logging
+import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 from helper.ctf_challenge import create_challenge_from_chaldir
-from helper.llm_helper import LiteLLMManager
-from helper.docker_manager import DockerManager
+from helper.llm_cassette import CASSETTE_FILE_NAME
+from helper.llm_helper import RECONCILE_WAIT_TIMEOUT, CostReconciler, LiteLLMManager
+from helper.docker_manager import DEFAULT_STOP_TIMEOUT, AgentWorkerPool, DockerManager, RESOURCE_LIMIT_KEYS
+from helper.local_runner import LocalAgentPool
+from helper.readiness import wait_for_services
+from helper.service_pool import ServicePool
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,51 +31,83 @@ def get_challenge_dirs(challenge_target=None):
     else:
         return [os.path.join(challenge_base_dir, d) for d in os.listdir(challenge_base_dir) if os.path.isdir(os.path.join(challenge_base_dir, d))]
 
-def evaluate_challenge(chal_dir, llm_manager, run_output_dir, run_timestamp):
+def evaluate_challenge(chal_dir, llm_manager, run_output_dir, run_timestamp, trial=None,
+                       fixed_host_ports=True, rebuild=False, service_pool=None,
+                       timeout=None, resource_limits=None, deadline=None,
+                       max_log_bytes=None, log_backups=0, stop_timeout=DEFAULT_STOP_TIMEOUT, dev=False,
+                       warm_agent=False, agent_workers=None, local_agents=None, replay_dir=None):
+    '''
+    Evaluates the agent on a single challenge.
+    When `trial` is set, results go to a `trial_<n>` subdirectory of the challenge output.
+    When `fixed_host_ports` is False, service ports are published on ephemeral host
+    ports so that several challenges can run side by side.
+    When `rebuild` is True, service images are rebuilt even if their sources are unchanged.
+    When a `service_pool` is given, services come from its warm stacks instead of a cold start.
+    `timeout` and `resource_limits` are the global agent container limits; the
+    challenge's own "limits" in challenge.json take precedence. The agent is also
+    killed at `deadline` (a timestamp), the end of the whole run.
+    The agent log is streamed to agent.log, rotated or capped at `max_log_bytes`.
+    Containers get `stop_timeout` seconds to exit on teardown.
+    With `dev`, the agent code is mounted into a dependency-only image instead of built in.
+    With `warm_agent`, the agent runs as a job on a long-lived agent worker: the pooled
+    stack's own worker for service challenges (requires `service_pool`), or one from
+    `agent_workers` for challenges without services.
+    With `local_agents`, challenges without services skip Docker entirely and run on
+    one of its worker processes; the result has the same schema.
+    With `replay_dir` (the output directory of an earlier run recorded with
+    LITELLM_CASSETTE_MODE=record), the challenge's cassette from that run is copied
+    next to this run's output so the agent can replay it.
+    '''
     challenge_name = os.path.basename(chal_dir)
-    logging.info(f"--- Running evaluation for challenge: {challenge_name} ---")
+    trial_label = f" (trial {trial})" if trial is not None else ""
+    logging.info(f"--- Running evaluation for challenge: {challenge_name}{trial_label} ---")
 
     challenge_output_dir = os.path.join(run_output_dir, challenge_name)
+    if trial is not None:
+        challenge_output_dir = os.path.join(challenge_output_dir, f"trial_{trial}")
     os.makedirs(challenge_output_dir)
+    if replay_dir:
+        cassette_path = os.path.join(replay_dir, os.path.relpath(challenge_output_dir, run_output_dir), CASSETTE_FILE_NAME)
+        if os.path.exists(cassette_path):
+            shutil.copy(cassette_path, challenge_output_dir)
+        else:
+            logging.warning(f"No cassette to replay for {challenge_name}{trial_label} at {cassette_path}")
 
     docker_manager = None
+    service_stack = None
+    agent_worker = None
     try:
         challenge = create_challenge_from_chaldir(chal_dir)
         
-        # Setup Docker environment for all challenges
-        docker_manager = DockerManager(logging.getLogger(f"docker_{challenge_name}"))
-        network_name = f"ctf-network-{challenge_name.lower().replace('_', '-')}"
-        network_id = docker_manager.create_network(network_name)
+        run_local = local_agents is not None and not challenge.services
         
-        # Start any additional services using simplified approach
-        services_deployed = []
-        for service in challenge.services:
-            # Build custom service image if needed
-            image_name = service['image']
-            docker_path = os.path.join(chal_dir, 'docker')
-            if os.path.exists(docker_path) and os.path.exists(os.path.join(docker_path, 'Dockerfile')):
-                logging.info(f"Building custom image: {image_name}")
-                docker_manager.client.images.build(
-                    path=docker_path,
-                    tag=image_name,
-                    rm=True,
-                    forcerm=True
-                )
-                logging.info(f"Successfully built custom image: {image_name}")
+        # Setup Docker environment for all challenges that need it
+        if not run_local:
+            docker_manager = DockerManager(logging.getLogger(f"docker_{challenge_name}"), run_id=run_timestamp,
+                                           challenge_name=challenge_name, stop_timeout=stop_timeout)
+        if service_pool and challenge.services:
+            # Take an already running stack; the pool owns its network and services
+            service_stack = service_pool.acquire(chal_dir)
+            network_name = service_stack.network_name
+            network_id = service_stack.network_id
+            services_started = service_stack.started
+            services_ready_time = service_stack.ready_time
+        elif run_local or (warm_agent and agent_workers and not challenge.services):
+            # The worker lives on its own network; there is nothing else to deploy
+            network_name = None
+            services_started = []
+            services_ready_time = {}
+        else:
+            network_name = docker_manager.unique_name(f"ctf-network-{challenge_name.lower().replace('_', '-')}")
+            network_id = docker_manager.create_network(network_name)
             
-            # Start the service container
-            docker_manager.start_container(
-                image=image_name,
-                name=service['name'],
-                network=network_name,
-                environment=service.get('environment', {}),
-                ports=service.get('ports', {})
+            # Start any additional services and probe them concurrently until they accept connections
+            services_started = docker_manager.deploy_services(
+                chal_dir, challenge.services, network_name,
+                fixed_host_ports=fixed_host_ports, rebuild=rebuild
             )
-            services_deployed.append(service['name'])
-            
-            # Simple wait for service to be ready (replace health checks)
-            time.sleep(3)
-            logging.info(f"Service {service['name']} is ready")
+            services_ready_time = wait_for_services(services_started, network_name, docker_manager.logger)
+        services_deployed = [item['service']['name'] for item in services_started]
         
         # Only create network_info if services were deployed
         network_info = None
@@ -81,7 +119,7 @@ def evaluate_challenge(chal_dir, llm_manager, run_output_dir, run_timestamp):
             }
         
         # Build and run agent in Docker
-        image_tag = docker_manager.build_agent_image(challenge_name)
+        image_tag = None if run_local else docker_manager.build_agent_image(dev=dev)
         
         # Prepare challenge data for Docker
         challenge_data = {
@@ -94,9 +132,38 @@ def evaluate_challenge(chal_dir, llm_manager, run_output_dir, run_timestamp):
             'network_info': network_info
         }
         
+        agent_limits = {**(resource_limits or {}), **{k: v for k, v in challenge.limits.items() if k in RESOURCE_LIMIT_KEYS}}
+        agent_timeout = challenge.limits.get('timeout', timeout)
+        if deadline is not None:
+            remaining = max(deadline - time.time(), 1)
+            agent_timeout = remaining if agent_timeout is None else min(agent_timeout, remaining)
+        
+        if warm_agent and service_stack:
+            if service_stack.agent_worker is None or not service_stack.agent_worker.alive:
+                if service_stack.agent_worker:
+                    service_stack.agent_worker.close()
+                service_stack.agent_worker = service_stack.docker_manager.start_agent_worker(
+                    network_name, image_tag, run_output_dir, resource_limits=agent_limits, dev=dev
+                )
+            agent_worker = service_stack.agent_worker
+        elif network_name is None and not run_local:
+            agent_worker = agent_workers.acquire(image_tag)
+        
         start_time = time.time()
         
-        docker_result = docker_manager.run_agent(challenge_data, network_name, challenge_output_dir, image_tag)
+        service_containers = [item['container'] for item in services_started]
+        if run_local:
+            docker_result = local_agents.run_challenge(challenge_data, challenge_output_dir, timeout=agent_timeout)
+        elif agent_worker:
+            docker_result = agent_worker.run_job(challenge_data, challenge_output_dir, timeout=agent_timeout,
+                                                 service_containers=service_containers,
+                                                 max_log_bytes=max_log_bytes, log_backups=log_backups)
+        else:
+            docker_result = docker_manager.run_agent(challenge_data, network_name, challenge_output_dir, image_tag,
+                                                     timeout=agent_timeout, resource_limits=agent_limits,
+                                                     max_log_bytes=max_log_bytes, log_backups=log_backups,
+                                                     service_containers=service_containers,
+                                                     dev=dev)
         
         end_time = time.time()
         
@@ -105,31 +172,46 @@ def evaluate_challenge(chal_dir, llm_manager, run_output_dir, run_timestamp):
         container_request_ids = docker_result['result'].get('llm_request_ids', [])
         container_cost = docker_result['result'].get('llm_cost', 0.0)
         
-        # Save Docker logs
-        with open(os.path.join(challenge_output_dir, "agent.log"), "w", encoding="utf-8") as f:
-            f.write(docker_result['logs'])
-
         # Use container's LLM usage data instead of host-level tracking
         challenge_request_ids = container_request_ids
         challenge_cost = container_cost
 
         duration = end_time - start_time
         success = found_flag is not None and found_flag == challenge.flag
+        if docker_result.get('timed_out'):
+            outcome = "timeout"
+        else:
+            outcome = "solved" if success else "failed"
 
-        logging.info(f"Challenge: {challenge_name}, Success: {success}, Time: {duration:.2f}s, Cost: ${challenge_cost:.6f}")
+        logging.info(f"Challenge: {challenge_name}, Outcome: {outcome}, Time: {duration:.2f}s, Cost: ${challenge_cost:.6f}")
 
         result_data = {
             "challenge_name": challenge.name,
             "success": success,
+            "outcome": outcome,
             "submitted_flag": found_flag,
             "correct_flag": challenge.flag,
             "start_time": datetime.fromtimestamp(start_time).isoformat(),
             "end_time": datetime.fromtimestamp(end_time).isoformat(),
             "duration": duration,
+            "timeout": agent_timeout,
+            "resource_limits": agent_limits,
+            "exit_code": docker_result.get('exit_code'),
+            "oom_killed": docker_result.get('oom_killed', False),
+            "service_failure": docker_result.get('service_failure'),
+            "resource_usage": docker_result.get('resource_usage', {}),
+            "agent_worker": docker_result.get('agent_worker'),
+            "log_bytes": docker_result.get('log_bytes', 0),
+            "log_truncated": docker_result.get('log_truncated', False),
             "cost": challenge_cost,
             "llm_request_ids": challenge_request_ids,
             "network_info": network_info,
+            "services_ready_time": services_ready_time,
+            "warm_services": service_stack is not None,
+            "agent_image": docker_manager.agent_image_info if docker_manager else None,
         }
+        if trial is not None:
+            result_data["trial"] = trial
 
         with open(os.path.join(challenge_output_dir, "result.json"), "w") as f:
             json.dump(result_data, f, indent=4)
@@ -141,18 +223,76 @@ def evaluate_challenge(chal_dir, llm_manager, run_output_dir, run_timestamp):
         error_data = {
             "challenge_name": challenge_name,
             "success": False,
+            "outcome": "error",
             "error": str(e),
         }
+        if trial is not None:
+            error_data["trial"] = trial
         with open(os.path.join(challenge_output_dir, "result.json"), "w") as f:
             json.dump(error_data, f, indent=4)
         return error_data
     finally:
-        # Cleanup Docker resources
+        # Cleanup Docker resources; pooled services are reset for the next run instead
         if docker_manager:
             docker_manager.cleanup()
+        if agent_worker and not service_stack:
+            agent_workers.release(agent_worker)
+        if service_stack:
+            service_pool.release(service_stack)
+
+def summarize_resource_usage(results):
+    """Roll up the agent container telemetry of all results for sizing hosts and --jobs."""
+    agent_usage = [r['resource_usage']['agent'] for r in results
+                   if r.get('resource_usage', {}).get('agent', {}).get('samples')]
+    if not agent_usage:
+        return {}
+    return {
+        "agent_runs_sampled": len(agent_usage),
+        "agent_cpu_percent_peak": max(u['cpu_percent_peak'] for u in agent_usage),
+        "agent_cpu_percent_avg": sum(u['cpu_percent_avg'] for u in agent_usage) / len(agent_usage),
+        "agent_memory_bytes_peak": max(u['memory_bytes_peak'] for u in agent_usage),
+        "agent_memory_bytes_avg": sum(u['memory_bytes_avg'] for u in agent_usage) / len(agent_usage),
+        "agent_pids_peak": max(u['pids_peak'] for u in agent_usage),
+        "agent_network_bytes_total": sum(u['network_rx_bytes'] + u['network_tx_bytes'] for u in agent_usage),
+        "agent_block_io_bytes_total": sum(u['block_read_bytes'] + u['block_write_bytes'] for u in agent_usage),
+    }
 
-def run_evaluation(challenge_dirs, llm_manager):
-    """Runs the evaluation against the specified challenges."""
+def reconcile_summary_costs(summary_data, proxy_costs):
+    """Add the proxy's spend for every result (and the run) next to the local cost estimates."""
+    requested, missing = set(), set()
+    for result in summary_data["detailed_results"]:
+        request_ids = result.get('llm_request_ids', [])
+        result["reconciled_cost"] = sum(proxy_costs.get(request_id) or 0.0 for request_id in request_ids)
+        requested.update(request_ids)
+        missing.update(request_id for request_id in request_ids if proxy_costs.get(request_id) is None)
+    summary_data["reconciled_total_cost"] = sum(cost for cost in proxy_costs.values() if cost is not None)
+    summary_data["cost_reconciliation"] = {
+        "requests": len(requested),
+        "reconciled": len(requested) - len(missing),
+        "missing_request_ids": sorted(missing),
+        "completed_at": datetime.now().isoformat(),
+    }
+
+def run_evaluation(challenge_dirs, llm_manager, jobs=1, rebuild=False, trials=1, warm_pool=0, pool_reset='restart',
+                   timeout=None, run_timeout=None, resource_limits=None, max_log_bytes=None, log_backups=0,
+                   stop_timeout=DEFAULT_STOP_TIMEOUT, dev=False, warm_agent=False, no_docker=False,
+                   reconcile_costs=True, replay_dir=None):
+    """
+    Runs the evaluation against the specified challenges, `jobs` at a time.
+    Each challenge is evaluated `trials` times. With `warm_pool` > 0, that many
+    service stacks per challenge are kept running and reset between uses.
+    Agents are killed after `timeout` seconds each, or when the whole run has
+    taken `run_timeout` seconds. Agent logs are rotated or capped at `max_log_bytes`.
+    With `dev`, agent code is mounted from the working tree instead of built into the image.
+    With `warm_agent`, agents run as jobs on long-lived agent workers: one per pooled
+    service stack and a shared set for challenges without services.
+    With `no_docker`, challenges without services run on `jobs` local worker processes
+    instead of in containers.
+    Costs reported by agents are local estimates; with `reconcile_costs`, the request
+    ids are checked against the proxy's spend logs in the background as challenges
+    finish, and summary.json is patched with the result once all lookups are done.
+    With `replay_dir`, agents replay the LLM responses recorded in that earlier run.
+    """
     results = []
     
     output_dir_base = "eval_results"
@@ -163,22 +303,86 @@ def run_evaluation(challenge_dirs, llm_manager):
     run_output_dir = os.path.join(output_dir_base, run_timestamp)
     os.makedirs(run_output_dir)
 
-    # Run Docker evaluations sequentially to avoid resource conflicts
-    for chal_dir in challenge_dirs:
-        try:
-            result = evaluate_challenge(chal_dir, llm_manager, run_output_dir, run_timestamp)
-            results.append(result)
-        except Exception as exc:
-            logging.error(f'{chal_dir} generated an exception: {exc}')
+    service_pool = None
+    if warm_pool > 0:
+        service_pool = ServicePool(size=warm_pool, reset_mode=pool_reset, rebuild=rebuild,
+                                   run_id=run_timestamp, stop_timeout=stop_timeout)
+        service_pool.prewarm(challenge_dirs)
+
+    agent_workers = None
+    if warm_agent:
+        agent_workers = AgentWorkerPool(run_output_dir, run_id=run_timestamp, stop_timeout=stop_timeout,
+                                        resource_limits=resource_limits, dev=dev)
+
+    local_agents = None
+    if no_docker:
+        local_agents = LocalAgentPool(workers=jobs)
+
+    cost_reconciler = CostReconciler() if reconcile_costs else None
+
+    def collect(result):
+        results.append(result)
+        if cost_reconciler:
+            cost_reconciler.submit(result.get('llm_request_ids', []))
+
+    deadline = time.time() + run_timeout if run_timeout else None
+    evaluation_options = {
+        'rebuild': rebuild,
+        'service_pool': service_pool,
+        'timeout': timeout,
+        'resource_limits': resource_limits,
+        'deadline': deadline,
+        'max_log_bytes': max_log_bytes,
+        'log_backups': log_backups,
+        'stop_timeout': stop_timeout,
+        'dev': dev,
+        'warm_agent': warm_agent,
+        'agent_workers': agent_workers,
+        'local_agents': local_agents,
+        'replay_dir': replay_dir,
+    }
+    evaluations = [(chal_dir, trial if trials > 1 else None) for chal_dir in challenge_dirs for trial in range(1, trials + 1)]
+    try:
+        if jobs <= 1:
+            for chal_dir, trial in evaluations:
+                try:
+                    result = evaluate_challenge(chal_dir, llm_manager, run_output_dir, run_timestamp, trial=trial,
+                                                **evaluation_options)
+                    collect(result)
+                except Exception as exc:
+                    logging.error(f'{chal_dir} generated an exception: {exc}')
+        else:
+            # Every evaluation owns uniquely named Docker resources, so they can run side by side
+            logging.info(f"Running {len(evaluations)} evaluations with {jobs} parallel jobs")
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(evaluate_challenge, chal_dir, llm_manager, run_output_dir, run_timestamp, trial=trial,
+                                    fixed_host_ports=False, **evaluation_options): chal_dir
+                    for chal_dir, trial in evaluations
+                }
+                for future in as_completed(futures):
+                    try:
+                        collect(future.result())
+                    except Exception as exc:
+                        logging.error(f'{futures[future]} generated an exception: {exc}')
+    finally:
+        if local_agents:
+            local_agents.shutdown()
+        if agent_workers:
+            agent_workers.shutdown()
+        if service_pool:
+            service_pool.shutdown()
 
     # Sort results alphabetically by challenge name
-    results.sort(key=lambda r: r.get('challenge_name', ''))
+    results.sort(key=lambda r: (r.get('challenge_name', ''), r.get('trial', 0)))
 
     logging.info("--- Evaluation Summary ---")
     successful_challenges = [r for r in results if r.get("success")]
+    timed_out_challenges = [r for r in results if r.get("outcome") == "timeout"]
     total_cost = sum(r.get('cost', 0) for r in results)
     logging.info(f"Total challenges run: {len(results)}")
     logging.info(f"Successful solves: {len(successful_challenges)}")
+    logging.info(f"Timed out: {len(timed_out_challenges)}")
     logging.info(f"Total cost: ${total_cost:.6f}")
     for res in successful_challenges:
         logging.info(f"  - {res['challenge_name']}")
@@ -188,10 +392,13 @@ def run_evaluation(challenge_dirs, llm_manager):
         "total_challenges": len(results),
         "successful_challenges_count": len(successful_challenges),
         "failed_challenges_count": len(results) - len(successful_challenges),
+        "timed_out_challenges_count": len(timed_out_challenges),
         "total_cost": total_cost,
         "average_duration": sum(r.get('duration', 0) for r in results) / len(results) if results else 0,
         "successful_challenges": [r['challenge_name'] for r in results if r.get('success')],
         "failed_challenges": [r['challenge_name'] for r in results if not r.get('success')],
+        "timed_out_challenges": [r['challenge_name'] for r in timed_out_challenges],
+        "resource_usage": summarize_resource_usage(results),
         "detailed_results": results,
     }
 
@@ -200,16 +407,78 @@ def run_evaluation(challenge_dirs, llm_manager):
     
     logging.info(f"Summary report saved to {os.path.join(run_output_dir, 'summary.json')}")
 
+    if cost_reconciler:
+        reconcile_summary_costs(summary_data, cost_reconciler.wait(timeout=RECONCILE_WAIT_TIMEOUT))
+        cost_reconciler.shutdown()
+        with open(os.path.join(run_output_dir, "summary.json"), "w") as f:
+            json.dump(summary_data, f, indent=4)
+        logging.info(f"Reconciled total cost: ${summary_data['reconciled_total_cost']:.6f}")
+
 
 def main():
     parser = argparse.ArgumentParser(description="Evaluate CTF agent.")
+    parser.add_argument("command", help="'run' evaluates challenges (default); 'gc' removes Docker resources left behind by dead runs.",
+                        nargs="?", choices=["run", "gc"], default="run")
+    parser.add_argument("--gc-all", help="With 'gc', also remove resources of runs that are still alive.", action="store_true")
     parser.add_argument("--challenge", help="Specify a single challenge directory name to run.", type=str, default=None)
+    parser.add_argument("--jobs", help="Number of challenges to evaluate in parallel.", type=int, default=1)
+    parser.add_argument("--rebuild", help="Rebuild challenge service images even if their sources are unchanged.", action="store_true")
+    parser.add_argument("--trials", help="Number of times to evaluate each challenge.", type=int, default=1)
+    parser.add_argument("--warm-pool", help="Number of ready service stacks to keep per challenge (0 disables the pool).", type=int, default=0)
+    parser.add_argument("--pool-reset", help="How pooled service stacks are reset between uses.", choices=["restart", "snapshot"], default="restart")
+    parser.add_argument("--timeout", help="Seconds before an agent container is killed (overridden by challenge.json limits).", type=float, default=None)
+    parser.add_argument("--run-timeout", help="Seconds the whole evaluation may take before remaining agents are killed.", type=float, default=None)
+    parser.add_argument("--mem-limit", help="Memory limit for agent containers, e.g. 2g.", type=str, default=None)
+    parser.add_argument("--cpus", help="Number of CPUs available to each agent container.", type=float, default=None)
+    parser.add_argument("--pids-limit", help="Maximum number of processes in each agent container.", type=int, default=None)
+    parser.add_argument("--max-log-mb", help="Rotate (or cap, without --log-backups) agent.log at this size in MB.", type=float, default=None)
+    parser.add_argument("--log-backups", help="Number of rotated agent.log files to keep.", type=int, default=0)
+    parser.add_argument("--stop-timeout", help="Seconds containers get to exit on teardown before being killed.", type=int, default=DEFAULT_STOP_TIMEOUT)
+    parser.add_argument("--dev", help="Mount agent/, helper/ and run_agent.py into a dependency-only image instead of rebuilding the agent image.", action="store_true")
+    parser.add_argument("--warm-agent", help="Run agents as jobs on long-lived agent containers (per warm service stack, and shared for challenges without services).", action="store_true")
+    parser.add_argument("--no-docker", help="Run challenges without services in local worker processes instead of agent containers.", action="store_true")
+    parser.add_argument("--llm-cache", help="Directory of an on-disk LLM response cache shared by all agents (off by default).", type=str, default=None)
+    parser.add_argument("--record", help="Record every LLM request/response to a cassette.jsonl per challenge in the run output.", action="store_true")
+    parser.add_argument("--replay", help="Replay LLM responses from the cassettes of an earlier run directory instead of calling the proxy.", type=str, default=None)
+    parser.add_argument("--replay-mismatch", help="What replay does when a request was not recorded.", choices=["strict", "nearest", "passthrough"], default="strict")
+    parser.add_argument("--no-reconcile", help="Skip checking the agents' local cost estimates against the proxy's spend logs.", action="store_true")
     args = parser.parse_args()
 
+    if args.command == "gc":
+        DockerManager(logging.getLogger("docker_gc"), stop_timeout=args.stop_timeout).collect_garbage(all_runs=args.gc_all)
+        return
+
+    resource_limits = {}
+    if args.mem_limit:
+        resource_limits['mem_limit'] = args.mem_limit
+    if args.cpus:
+        resource_limits['nano_cpus'] = int(args.cpus * 1e9)
+    if args.pids_limit:
+        resource_limits['pids_limit'] = args.pids_limit
+
+    if args.llm_cache:
+        # Picked up by every LiteLLMManager, including those in agent containers and local workers
+        os.environ['LITELLM_CACHE_DIR'] = os.path.abspath(args.llm_cache)
+
+    if args.jobs > 1 and os.environ.get('LITELLM_RATE_LIMITS'):
+        # LITELLM_RATE_LIMITS is the budget of the whole run; every agent limits itself to its share
+        os.environ['LITELLM_RATE_LIMIT_SHARES'] = str(args.jobs)
+
+    if args.record or args.replay:
+        # Picked up by the LiteLLMManager of every agent, in containers and local workers alike
+        os.environ['LITELLM_CASSETTE_MODE'] = 'replay' if args.replay else 'record'
+        os.environ['LITELLM_CASSETTE_MISMATCH'] = args.replay_mismatch
+
     llm_manager = LiteLLMManager()
     challenge_dirs = get_challenge_dirs(args.challenge)
     if challenge_dirs:
-        run_evaluation(challenge_dirs, llm_manager)
+        run_evaluation(challenge_dirs, llm_manager, jobs=args.jobs, rebuild=args.rebuild,
+                       trials=args.trials, warm_pool=args.warm_pool, pool_reset=args.pool_reset,
+                       timeout=args.timeout, run_timeout=args.run_timeout, resource_limits=resource_limits,
+                       max_log_bytes=int(args.max_log_mb * 1024 * 1024) if args.max_log_mb else None,
+                       log_backups=args.log_backups, stop_timeout=args.stop_timeout, dev=args.dev,
+                       warm_agent=args.warm_agent, no_docker=args.no_docker,
+                       reconcile_costs=not (args.no_reconcile or args.replay), replay_dir=args.replay)
     else:
         logging.warning("No challenges found to evaluate.")
 
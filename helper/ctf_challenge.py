@@ -13,7 +13,7 @@ class CTFChallenge:
     Supports both file-based challenges (with artifacts) and network-based 
     challenges (with deployed services).
     """
-    def __init__(self, name: str, description: str, categories: list[str], artifacts_folder: str, flag: str, flag_regex: str, services: Optional[List[Dict[str, Any]]] = None):
+    def __init__(self, name: str, description: str, categories: list[str], artifacts_folder: str, flag: str, flag_regex: str, services: Optional[List[Dict[str, Any]]] = None, limits: Optional[Dict[str, Any]] = None):
         self.name = name
         self.description = description
         self.categories = categories
@@ -21,6 +21,7 @@ class CTFChallenge:
         self.flag = flag
         self.flag_regex = flag_regex
         self.services = services or []
+        self.limits = limits or {}
 
     def __str__(self) -> str:
         return f"CTFChallenge(name={self.name}, description={self.description}, categories={self.categories}, artifacts_folder={self.artifacts_folder}, flag_regex={self.flag_regex}, services={len(self.services)} services)"
@@ -105,8 +106,9 @@ def create_challenge_from_chaldir(chaldir: str):
     if not os.path.isdir(artifacts_folder):
         raise FileNotFoundError(f"Artifacts folder 'artifacts' not found in {chaldir}")
     
-    # Load services if present
+    # Load services and agent timeout / resource limits if present
     services = data.get("services", [])
+    limits = data.get("limits", {})
     
     challenge = CTFChallenge(
         name=data["name"],
@@ -115,7 +117,8 @@ def create_challenge_from_chaldir(chaldir: str):
         artifacts_folder=artifacts_folder,
         flag=data["flag"],
         flag_regex=data["flag_regex"],
-        services=services
+        services=services,
+        limits=limits
     )
     
     return challenge
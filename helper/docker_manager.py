@@ -3,10 +3,18 @@ import tempfile
 import os
 import shutil
 import json
+import hashlib
+import io
 import logging
+import socket
+import tarfile
+import threading
+import time
+import uuid
 import dotenv
-from typing import Dict, Optional, Any
-from docker.errors import NotFound
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Any
+from docker.errors import ImageNotFound, NotFound
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
@@ -17,23 +25,486 @@ missing_vars = [var for var in required_env_vars if not os.getenv(var)]
 if missing_vars:
     raise EnvironmentError(f"Missing required environment variables: {missing_vars}. Please check your .env file.")
 
+# Everything the agent image is built from (exactly what docker/agent/Dockerfile copies);
+# the image tag is derived from a hash of these and they form the whole build context
+AGENT_IMAGE_REPOSITORY = "ctf-agent"
+AGENT_DOCKERFILE = "docker/agent/Dockerfile"
+AGENT_IMAGE_INPUTS = ["docker/agent", "agent", "helper", "pyproject.toml"]
+
+# Dev mode builds only the dependency stage of the Dockerfile and mounts the code instead
+AGENT_BASE_IMAGE_REPOSITORY = "ctf-agent-base"
+AGENT_BASE_TARGET = "base"
+AGENT_BASE_IMAGE_INPUTS = [AGENT_DOCKERFILE, "pyproject.toml"]
+AGENT_DEV_MOUNTS = {
+    "agent": "/app/agent",
+    "helper": "/app/helper",
+    "docker/agent/run_agent.py": "/app/run_agent.py",
+}
+# A host LLM response cache (LITELLM_CACHE_DIR) is shared with agent containers at this path
+LLM_CACHE_MOUNT = "/app/llm-cache"
+
+# Container options that can be set per challenge (challenge.json "limits") or globally
+RESOURCE_LIMIT_KEYS = ('mem_limit', 'nano_cpus', 'pids_limit')
+
+# Labels put on every container and network so resources can be found, and reaped, in bulk
+MANAGED_LABEL = "ctf.managed"
+RUN_LABEL = "ctf.run"
+CHALLENGE_LABEL = "ctf.challenge"
+HOST_LABEL = "ctf.host"
+PID_LABEL = "ctf.pid"
+
+# Identifies this process's run when the caller does not provide a run id
+DEFAULT_RUN_ID = uuid.uuid4().hex[:12]
+
+# Seconds containers get to exit after SIGTERM before they are killed during teardown
+DEFAULT_STOP_TIMEOUT = 2
+
+# Seconds between resource usage samples of running containers
+STATS_POLL_INTERVAL = 1.0
+
+# Image label holding the fingerprint of the build context a service image was built from
+BUILD_FINGERPRINT_LABEL = "ctf.build-fingerprint"
+# Image label holding the repository of an agent image, so stale tags can be garbage collected
+AGENT_IMAGE_LABEL = "ctf.agent-image"
+
+_IGNORED_BUILD_FILES = ('__pycache__', '.pyc', '.pyo')
+
+
+def _iter_files(paths: Iterable[str]) -> Iterable[str]:
+    """Yield every file under the given paths in a stable order, skipping bytecode caches."""
+    for path in sorted(paths):
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.endswith(_IGNORED_BUILD_FILES))
+            for file in sorted(files):
+                if not file.endswith(_IGNORED_BUILD_FILES):
+                    yield os.path.join(root, file)
+
+
+def fingerprint_paths(paths: Iterable[str], root: str = ".") -> str:
+    """Hash the names (relative to ``root``) and contents of all files under the given paths."""
+    digest = hashlib.sha256()
+    for file_path in _iter_files(paths):
+        relative_path = os.path.relpath(file_path, root)
+        digest.update(relative_path.replace(os.sep, '/').encode('utf-8') + b'\0')
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def agent_image_tag(dev: bool = False) -> str:
+    """The tag of the agent image (or with ``dev`` its dependency-only base) for the current sources."""
+    inputs = AGENT_BASE_IMAGE_INPUTS if dev else AGENT_IMAGE_INPUTS
+    repository = AGENT_BASE_IMAGE_REPOSITORY if dev else AGENT_IMAGE_REPOSITORY
+    return f"{repository}:{fingerprint_paths(inputs)[:16]}"
+
+
+def build_context_archive(paths: Iterable[str]) -> io.BytesIO:
+    """
+    Return an in-memory tar archive holding only the given paths, laid out as in the
+    project root. Packing takes milliseconds, and is only needed when no image for
+    the current sources exists, so archives are never cached on disk.
+    """
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w') as tar:
+        for file_path in _iter_files(paths):
+            tar.add(file_path, arcname=file_path.replace(os.sep, '/'))
+    archive.seek(0)
+    return archive
+
+
+def link_tree(src: str, dst: str):
+    """Mirror a directory tree with hardlinks, falling back to copies across filesystems."""
+    for root, dirs, files in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        for file in files:
+            try:
+                os.link(os.path.join(root, file), os.path.join(target_root, file))
+            except OSError:
+                shutil.copy2(os.path.join(root, file), os.path.join(target_root, file))
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _run_concurrently(action: Callable[[Any], None], items: List[Any]):
+    """Apply ``action`` to every item in parallel and wait for all of them."""
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=min(len(items), 16)) as executor:
+        list(executor.map(action, items))
+
+
+class LogStreamWriter:
+    """
+    Writes a container's log stream to a file as it arrives, with bounded memory.
+
+    When ``max_bytes`` is set the file is rotated once it reaches that size,
+    keeping ``backup_count`` older files (``agent.log.1`` is the most recent).
+    With ``backup_count`` of 0 the file is capped instead and further output is
+    dropped.
+    """
+    def __init__(self, path: str, max_bytes: Optional[int] = None, backup_count: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.bytes_written = 0
+        self.truncated = False
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb')
+        self._file_bytes = 0
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, 'wb')
+        self._file_bytes = 0
+
+    def write(self, chunk: bytes):
+        with self._lock:
+            if not self._file.closed:
+                self._write(chunk)
+
+    def _write(self, chunk: bytes):
+        while chunk and not self.truncated:
+            if self.max_bytes is None:
+                part = chunk
+            else:
+                if self._file_bytes >= self.max_bytes:
+                    if self.backup_count == 0:
+                        self._file.write(b"\n[log truncated: size cap reached]\n")
+                        self.truncated = True
+                        break
+                    self._rotate()
+                part = chunk[:self.max_bytes - self._file_bytes]
+            self._file.write(part)
+            self._file.flush()
+            self._file_bytes += len(part)
+            self.bytes_written += len(part)
+            chunk = chunk[len(part):]
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ContainerStatsSampler:
+    """
+    Resource usage of one container, sampled by the shared ContainerStatsPoller.
+    Keeps running aggregates only, so memory use is constant however long the run is.
+    """
+    def __init__(self, container: Any, logger: Optional[logging.Logger] = None):
+        self.container = container
+        self.logger = logger or logging.getLogger(__name__)
+        self.samples = 0
+        self.cpu_samples = 0
+        self.cpu_percent_total = 0.0
+        self.cpu_percent_peak = 0.0
+        self.memory_bytes_total = 0
+        self.memory_bytes_peak = 0
+        self.pids_peak = 0
+        self.network_rx_bytes = 0
+        self.network_tx_bytes = 0
+        self.block_read_bytes = 0
+        self.block_write_bytes = 0
+        self._previous_cpu: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        ContainerStatsPoller.get().add(self)
+
+    def poll(self):
+        """Take one sample; called from the poller's thread."""
+        if self._stopped:
+            return
+        try:
+            stats = self.container.stats(stream=False, one_shot=True)
+        except Exception as e:
+            self.logger.debug(f"Could not sample stats of {self.container.name}: {e}")
+            return
+        with self._lock:
+            if not self._stopped:
+                self._record(stats)
+
+    def _record(self, stats: Dict[str, Any]):
+        cpu, memory = stats.get('cpu_stats', {}), stats.get('memory_stats', {})
+        if not memory.get('usage'):
+            # The container is not (or no longer) running
+            return
+        
+        # One-shot samples carry no previous CPU reading, so CPU use is measured between polls
+        precpu, self._previous_cpu = self._previous_cpu, cpu
+        if precpu is not None:
+            cpu_delta = cpu.get('cpu_usage', {}).get('total_usage', 0) - precpu.get('cpu_usage', {}).get('total_usage', 0)
+            system_delta = cpu.get('system_cpu_usage', 0) - precpu.get('system_cpu_usage', 0)
+            online_cpus = cpu.get('online_cpus') or len(cpu.get('cpu_usage', {}).get('percpu_usage') or [1])
+            cpu_percent = cpu_delta / system_delta * online_cpus * 100 if system_delta > 0 and cpu_delta > 0 else 0.0
+            self.cpu_samples += 1
+            self.cpu_percent_total += cpu_percent
+            self.cpu_percent_peak = max(self.cpu_percent_peak, cpu_percent)
+        # Page cache is reclaimable, so it is not counted (cgroup v2 "inactive_file", v1 "cache")
+        memory_stats = memory.get('stats', {})
+        memory_bytes = memory['usage'] - memory_stats.get('inactive_file', memory_stats.get('cache', 0))
+        
+        self.samples += 1
+        self.memory_bytes_total += memory_bytes
+        self.memory_bytes_peak = max(self.memory_bytes_peak, memory_bytes)
+        self.pids_peak = max(self.pids_peak, stats.get('pids_stats', {}).get('current', 0))
+        # Network and block I/O counters are cumulative
+        networks = stats.get('networks') or {}
+        self.network_rx_bytes = max(self.network_rx_bytes, sum(n.get('rx_bytes', 0) for n in networks.values()))
+        self.network_tx_bytes = max(self.network_tx_bytes, sum(n.get('tx_bytes', 0) for n in networks.values()))
+        io = stats.get('blkio_stats', {}).get('io_service_bytes_recursive') or []
+        self.block_read_bytes = max(self.block_read_bytes, sum(e.get('value', 0) for e in io if e.get('op', '').lower() == 'read'))
+        self.block_write_bytes = max(self.block_write_bytes, sum(e.get('value', 0) for e in io if e.get('op', '').lower() == 'write'))
+
+    def cancel(self):
+        """Stop sampling."""
+        with self._lock:
+            self._stopped = True
+        ContainerStatsPoller.get().remove(self)
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling and return peak and average usage."""
+        self.cancel()
+        return {
+            'samples': self.samples,
+            'cpu_percent_peak': self.cpu_percent_peak,
+            'cpu_percent_avg': self.cpu_percent_total / self.cpu_samples if self.cpu_samples else 0.0,
+            'memory_bytes_peak': self.memory_bytes_peak,
+            'memory_bytes_avg': self.memory_bytes_total / self.samples if self.samples else 0,
+            'pids_peak': self.pids_peak,
+            'network_rx_bytes': self.network_rx_bytes,
+            'network_tx_bytes': self.network_tx_bytes,
+            'block_read_bytes': self.block_read_bytes,
+            'block_write_bytes': self.block_write_bytes,
+        }
+
+
+class ContainerStatsPoller:
+    """
+    Samples every ContainerStatsSampler of this process from a single background
+    thread, polling ``container.stats(stream=False, one_shot=True)`` for each one
+    every ``interval`` seconds, so telemetry costs no thread or open stats stream
+    per container. Use ``ContainerStatsPoller.get()`` to share one poller per process.
+    """
+    _instance: Optional['ContainerStatsPoller'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, interval: float = STATS_POLL_INTERVAL):
+        self.interval = interval
+        self._samplers: List[ContainerStatsSampler] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="container-stats", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def get(cls) -> 'ContainerStatsPoller':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def add(self, sampler: ContainerStatsSampler):
+        with self._lock:
+            self._samplers.append(sampler)
+        self._wake.set()
+
+    def remove(self, sampler: ContainerStatsSampler):
+        with self._lock:
+            if sampler in self._samplers:
+                self._samplers.remove(sampler)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            started = time.time()
+            with self._lock:
+                samplers = list(self._samplers)
+                if not samplers:
+                    self._wake.clear()
+                    continue
+            for sampler in samplers:
+                sampler.poll()
+            time.sleep(max(self.interval - (time.time() - started), 0))
+
+
+class ContainerWatch:
+    """
+    What the supervisor knows about one container: ``exited`` resolves with the
+    exit code when it dies, ``oom_killed`` is set if the kernel killed it for
+    memory and ``health`` holds its last reported health status. ``failed``
+    resolves with what went wrong ("died" or "became unhealthy") as soon as the
+    container dies or its healthcheck reports it unhealthy.
+    """
+    def __init__(self, container: Any):
+        self.container = container
+        self.exited: Future = Future()
+        self.failed: Future = Future()
+        self.oom_killed = False
+        self.health: Optional[str] = None
+
+    def _fail(self, reason: str):
+        if not self.failed.done():
+            self.failed.set_result(reason)
+
+    def resolve(self, exit_code: int):
+        if not self.exited.done():
+            self.exited.set_result(exit_code)
+        self._fail("died")
+
+    def set_health(self, status: str):
+        self.health = status
+        if status == 'unhealthy':
+            self._fail("became unhealthy")
+
+
+class ContainerSupervisor:
+    """
+    Supervises containers of this process through a single Docker events stream.
+
+    One background thread subscribes to die, oom and health events for containers
+    labelled with this process's pid and dispatches them to ContainerWatch objects,
+    so waiting evaluations need no blocking ``container.wait()`` call each.
+    Use ``ContainerSupervisor.get()`` to share one supervisor per process.
+    """
+    _instance: Optional['ContainerSupervisor'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.client = docker.from_env()
+        self.logger = logger or logging.getLogger(__name__)
+        self._watches: Dict[str, ContainerWatch] = {}
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="container-supervisor", daemon=True)
+        self._thread.start()
+        self._connected.wait(timeout=10)
+
+    @classmethod
+    def get(cls) -> 'ContainerSupervisor':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _run(self):
+        filters = {'type': 'container', 'label': [f"{MANAGED_LABEL}=true", f"{PID_LABEL}={os.getpid()}"]}
+        while True:
+            try:
+                events = self.client.events(decode=True, filters=filters)
+                self._connected.set()
+                # Catch up on anything that happened while the stream was down
+                self._reconcile()
+                for event in events:
+                    self._dispatch(event)
+            except Exception as e:
+                self.logger.warning(f"Docker events stream interrupted, reconnecting: {e}")
+            time.sleep(1)
+
+    def _dispatch(self, event: Dict[str, Any]):
+        action = event.get('Action') or event.get('status') or ''
+        actor = event.get('Actor', {})
+        with self._lock:
+            watch = self._watches.get(actor.get('ID') or event.get('id', ''))
+        if watch is None:
+            return
+        if action == 'oom':
+            watch.oom_killed = True
+        elif action == 'die':
+            watch.resolve(int(actor.get('Attributes', {}).get('exitCode', -1)))
+        elif action.startswith('health_status'):
+            watch.set_health(action.split(':', 1)[-1].strip())
+
+    def _reconcile(self):
+        with self._lock:
+            watches = list(self._watches.values())
+        for watch in watches:
+            self._check_state(watch)
+
+    def _check_state(self, watch: ContainerWatch):
+        try:
+            watch.container.reload()
+        except NotFound:
+            watch.resolve(-1)
+            return
+        state = watch.container.attrs.get('State', {})
+        if state.get('OOMKilled'):
+            watch.oom_killed = True
+        if state.get('Health', {}).get('Status'):
+            watch.set_health(state['Health']['Status'])
+        if watch.container.status in ('exited', 'dead'):
+            watch.resolve(state.get('ExitCode', -1))
+
+    def watch(self, container: Any) -> ContainerWatch:
+        """Start supervising a container; covers deaths that happened before this call."""
+        watch = ContainerWatch(container)
+        with self._lock:
+            self._watches[container.id] = watch
+        self._check_state(watch)
+        return watch
+
+    def unwatch(self, watch: ContainerWatch):
+        with self._lock:
+            self._watches.pop(watch.container.id, None)
+
+
 class DockerManager:
     """
     Simple Docker manager for CTF challenges.
     
     Provides containerized execution environment for CTF agents with:
     - Isolated networks per challenge
+    - Collision-free resource names so several managers can run concurrently
     - Multi-service deployment support
     - File-based Docker image building
+    - Content-hashed agent image reused across challenges and runs
+    - Fingerprint-labelled service images that are only rebuilt when their sources change
     - Volume mounting for artifacts and output
-    - Automatic cleanup of resources
+    - Labelled resources with concurrent cleanup and garbage collection of dead runs
     """
     
-    def __init__(self, logger: Optional[logging.Logger] = None):
+    # Shared by all managers so parallel evaluations never build the same image twice
+    _agent_image_lock = threading.Lock()
+    _service_image_locks: Dict[str, threading.Lock] = {}
+    _service_image_locks_guard = threading.Lock()
+    
+    def __init__(self, logger: Optional[logging.Logger] = None, name_suffix: Optional[str] = None,
+                 run_id: Optional[str] = None, challenge_name: Optional[str] = None,
+                 stop_timeout: int = DEFAULT_STOP_TIMEOUT):
         self.client = docker.from_env()
         self.logger = logger or logging.getLogger(__name__)
+        self.name_suffix = name_suffix or uuid.uuid4().hex[:8]
+        self.stop_timeout = stop_timeout
+        self.labels = {
+            MANAGED_LABEL: "true",
+            RUN_LABEL: run_id or DEFAULT_RUN_ID,
+            CHALLENGE_LABEL: challenge_name or "",
+            HOST_LABEL: socket.gethostname(),
+            PID_LABEL: str(os.getpid()),
+        }
         self.containers = []
         self.networks = []
+        self.agent_image_info: Dict[str, Any] = {}
+
+    def unique_name(self, name: str) -> str:
+        """Suffix a resource name so that concurrent evaluations never share it."""
+        return f"{name}-{self.name_suffix}"
         
     def create_network(self, name: str) -> str:
         """Create a Docker network."""
@@ -46,7 +517,7 @@ class DockerManager:
             except NotFound:
                 pass
             
-            network = self.client.networks.create(name, driver="bridge")
+            network = self.client.networks.create(name, driver="bridge", labels=self.labels)
             self.networks.append(network)
             self.logger.info(f"Created Docker network: {name}")
             return network.id or ""
@@ -54,37 +525,113 @@ class DockerManager:
             self.logger.error(f"Failed to create network {name}: {e}")
             raise
     
-    def build_agent_image(self, challenge_name: str) -> str:
-        """Build the agent Docker image using existing Dockerfile."""
+    def image_exists(self, tag: str) -> bool:
+        """Check whether an image with the given tag exists locally."""
         try:
-            # Use the existing Dockerfile and build context
-            dockerfile_path = "docker/agent"  # Use forward slashes for Docker
-            if not os.path.exists(dockerfile_path):
-                raise FileNotFoundError(f"Agent Dockerfile not found at {dockerfile_path}")
-            
-            image_tag = f"ctf-agent:{challenge_name}"
-            
-            # Build the image using the project root as context
-            image, build_logs = self.client.images.build(
-                path=".",  # Use current directory as build context
-                dockerfile=f"{dockerfile_path}/Dockerfile",  # Forward slash for Docker
-                tag=image_tag,
-                rm=True,
-                forcerm=True
-            )
+            self.client.images.get(tag)
+            return True
+        except ImageNotFound:
+            return False
+
+    def build_agent_image(self, dev: bool = False) -> str:
+        """
+        Build the agent Docker image using existing Dockerfile.
+
+        The tag is derived from a hash of AGENT_IMAGE_INPUTS, so the build is skipped
+        entirely when an image for the current sources already exists locally.
+        Otherwise only those inputs are sent to the daemon as the build context.
+        With ``dev`` only the dependency stage is built (from AGENT_BASE_IMAGE_INPUTS),
+        so code changes never trigger a build; run_agent then mounts the code.
+        Build statistics are kept in ``agent_image_info``.
+        """
+        try:
+            if not os.path.exists(AGENT_DOCKERFILE):
+                raise FileNotFoundError(f"Agent Dockerfile not found at {AGENT_DOCKERFILE}")
             
-            self.logger.info(f"Built agent image: {image_tag}")
+            inputs = AGENT_BASE_IMAGE_INPUTS if dev else AGENT_IMAGE_INPUTS
+            repository = AGENT_BASE_IMAGE_REPOSITORY if dev else AGENT_IMAGE_REPOSITORY
+            image_tag = agent_image_tag(dev)
+            
+            with self._agent_image_lock:
+                if self.image_exists(image_tag):
+                    self.logger.info(f"Reusing cached agent image: {image_tag}")
+                    self.agent_image_info = {'tag': image_tag, 'cached': True}
+                    return image_tag
+                
+                build_start = time.time()
+                context = build_context_archive(inputs)
+                context_size = context.getbuffer().nbytes
+                image, build_logs = self.client.images.build(
+                    fileobj=context,
+                    custom_context=True,
+                    dockerfile=AGENT_DOCKERFILE,  # Path inside the context archive
+                    target=AGENT_BASE_TARGET if dev else None,
+                    tag=image_tag,
+                    labels={MANAGED_LABEL: "true", AGENT_IMAGE_LABEL: repository},
+                    rm=True,
+                    forcerm=True
+                )
+                build_time = time.time() - build_start
+            
+            self.agent_image_info = {
+                'tag': image_tag,
+                'cached': False,
+                'context_size_bytes': context_size,
+                'build_time': build_time,
+            }
+            self.logger.info(f"Built agent image: {image_tag} (context {context_size} bytes, {build_time:.2f}s)")
             return image_tag
             
         except Exception as e:
             self.logger.error(f"Failed to build image: {e}")
             raise
     
+    def build_service_image(self, docker_path: str, tag: str, rebuild: bool = False) -> bool:
+        """
+        Build a challenge service image from ``docker_path`` unless an image with the
+        same tag was already built from identical sources.
+
+        Returns True if a build was performed, False if the cached image was reused.
+        """
+        with self._service_image_locks_guard:
+            lock = self._service_image_locks.setdefault(tag, threading.Lock())
+        
+        with lock:
+            fingerprint = fingerprint_paths([docker_path], root=docker_path)
+            if not rebuild:
+                try:
+                    image = self.client.images.get(tag)
+                    if image.labels.get(BUILD_FINGERPRINT_LABEL) == fingerprint:
+                        self.logger.info(f"Reusing cached service image: {tag}")
+                        return False
+                except ImageNotFound:
+                    pass
+            
+            self.logger.info(f"Building custom image: {tag}")
+            self.client.images.build(
+                path=docker_path,
+                tag=tag,
+                labels={BUILD_FINGERPRINT_LABEL: fingerprint},
+                rm=True,
+                forcerm=True
+            )
+            self.logger.info(f"Successfully built custom image: {tag}")
+            return True
+    
     def start_container(self, image: str, name: str, network: str, 
                        environment: Optional[Dict[str, str]] = None,
                        volumes: Optional[Dict[str, Dict[str, str]]] = None,
-                       ports: Optional[Dict[str, int]] = None) -> Any:
-        """Start a Docker container with specified configuration."""
+                       ports: Optional[Dict[str, Optional[int]]] = None,
+                       alias: Optional[str] = None,
+                       resource_limits: Optional[Dict[str, Any]] = None,
+                       command: Optional[List[str]] = None) -> Any:
+        """
+        Start a Docker container with specified configuration.
+
+        If ``alias`` is given the container is reachable under that hostname on
+        ``network`` regardless of its (unique) container name. ``resource_limits``
+        may set any of RESOURCE_LIMIT_KEYS.
+        """
         try:
             # Stop and remove existing container if it exists
             try:
@@ -95,15 +642,25 @@ class DockerManager:
             except NotFound:
                 pass
             
+            networking_config = None
+            if alias:
+                networking_config = {
+                    network: self.client.api.create_endpoint_config(aliases=[alias])
+                }
+            
             container = self.client.containers.run(
                 image=image,
+                command=command,
                 name=name,
                 network=network,
+                networking_config=networking_config,
                 environment=environment or {},
                 volumes=volumes or {},
                 ports=ports or {},
+                labels=self.labels,
                 detach=True,
-                remove=False
+                remove=False,
+                **(resource_limits or {})
             )
             
             self.containers.append(container)
@@ -114,36 +671,158 @@ class DockerManager:
             self.logger.error(f"Failed to start container {name}: {e}")
             raise
     
-    def run_agent(self, challenge_data: Dict, network_name: str, output_dir: str, image_tag: str) -> Dict:
-        """Run the agent in a Docker container."""
-        container_name = f"agent-{challenge_data['name'].lower().replace(' ', '-')}"
+    def deploy_services(self, chal_dir: str, services: List[Dict[str, Any]], network: str,
+                        fixed_host_ports: bool = True, rebuild: bool = False) -> List[Dict[str, Any]]:
+        """
+        Build (if needed) and start the services of a challenge on ``network``.
+
+        Each service container gets a unique name and is reachable under its declared
+        name as a network alias. When ``fixed_host_ports`` is False, ports are published
+        on ephemeral host ports. Returns ``{'service': ..., 'container': ...}`` items.
+        """
+        started = []
+        images_prepared = set()
+        docker_path = os.path.join(chal_dir, 'docker')
+        for service in services:
+            # Build custom service image if needed, once per image
+            image_name = service['image']
+            if (image_name not in images_prepared and
+                    os.path.exists(os.path.join(docker_path, 'Dockerfile'))):
+                self.build_service_image(docker_path, image_name, rebuild=rebuild)
+            images_prepared.add(image_name)
+            
+            ports = service.get('ports', {})
+            if not fixed_host_ports:
+                ports = {container_port: None for container_port in ports}
+            container = self.start_container(
+                image=image_name,
+                name=self.unique_name(service['name']),
+                network=network,
+                environment=service.get('environment', {}),
+                ports=ports,
+                alias=service['name']
+            )
+            started.append({'service': service, 'container': container})
+        return started
+    
+    def _stream_logs(self, container: Any, writer: LogStreamWriter):
+        try:
+            for chunk in container.logs(stream=True, follow=True):
+                writer.write(chunk)
+        except Exception as e:
+            self.logger.error(f"Log stream for {container.name} ended with error: {e}")
+
+    def _read_final_result(self, output_dir: str, timed_out_after: Optional[float] = None,
+                           service_failure: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(output_dir, 'final_result.txt'), 'r') as f:
+                return json.loads(f.read())
+        except Exception as e:
+            if timed_out_after is not None:
+                return {'found_flag': None, 'success': False, 'error': f'Timed out after {timed_out_after:.0f}s'}
+            if service_failure:
+                return {'found_flag': None, 'success': False, 'error': service_failure}
+            self.logger.error(f"Failed to read final result: {e}")
+            return {'found_flag': None, 'success': False, 'error': 'Failed to read result'}
+
+    def _agent_environment(self) -> Dict[str, str]:
+        environment = {
+            # Copy LiteLLM environment variables for API access
+            'LITELLM_BASE_URL': os.environ.get('LITELLM_BASE_URL', ''),
+            'LITELLM_API_KEY': os.environ.get('LITELLM_API_KEY', ''),
+        }
+        if os.environ.get('LITELLM_CACHE_DIR'):
+            environment['LITELLM_CACHE_DIR'] = LLM_CACHE_MOUNT
+        for name in ('LITELLM_CACHE_MAX_MB', 'LITELLM_CACHE_MAX_AGE', 'LITELLM_CASSETTE_MODE', 'LITELLM_CASSETTE_MISMATCH',
+                     'LITELLM_RATE_LIMITS', 'LITELLM_RATE_LIMIT_SHARES', 'LITELLM_MAX_RETRIES'):
+            if os.environ.get(name):
+                environment[name] = os.environ[name]
+        return environment
+
+    def _agent_cache_volumes(self) -> Dict[str, Dict[str, str]]:
+        cache_dir = os.environ.get('LITELLM_CACHE_DIR')
+        if not cache_dir:
+            return {}
+        os.makedirs(cache_dir, exist_ok=True)
+        return {os.path.abspath(cache_dir): {'bind': LLM_CACHE_MOUNT, 'mode': 'rw'}}
+
+    def start_agent_worker(self, network_name: str, image_tag: str, results_root: str,
+                           resource_limits: Optional[Dict[str, Any]] = None, dev: bool = False) -> 'AgentWorker':
+        """
+        Start a long-lived agent container on ``network_name`` that serves challenge
+        jobs (see AgentWorker). Only the worker's own job directory, created under
+        ``results_root``, is mounted; each job gets its artifacts and output
+        directory there, so a job never sees other challenges' files or results.
+        """
+        name = self.unique_name("agent-worker")
+        jobs_dir = os.path.join(os.path.abspath(results_root), AgentWorker.JOBS_DIR_NAME, name)
+        os.makedirs(jobs_dir, exist_ok=True)
+        volumes = {
+            jobs_dir: {'bind': AgentWorker.JOBS_MOUNT, 'mode': 'rw'},
+            **self._agent_cache_volumes(),
+        }
+        if dev:
+            for source, target in AGENT_DEV_MOUNTS.items():
+                volumes[os.path.abspath(source)] = {'bind': target, 'mode': 'ro'}
         
-        # Create temporary directories for volume mounting
-        temp_output = tempfile.mkdtemp(prefix="ctf_output_")
-        temp_artifacts = tempfile.mkdtemp(prefix="ctf_artifacts_")
+        container = self.start_container(
+            image=image_tag,
+            name=name,
+            network=network_name,
+            environment=self._agent_environment(),
+            volumes=volumes,
+            resource_limits=resource_limits,
+            command=["python", "run_agent.py", "--serve", AgentWorker.JOBS_MOUNT]
+        )
+        return AgentWorker(self, container, jobs_dir)
+
+    def run_agent(self, challenge_data: Dict, network_name: str, output_dir: str, image_tag: str,
+                  timeout: Optional[float] = None, resource_limits: Optional[Dict[str, Any]] = None,
+                  max_log_bytes: Optional[int] = None, log_backups: int = 0,
+                  service_containers: Optional[List[Any]] = None, dev: bool = False) -> Dict:
+        """
+        Run the agent in a Docker container.
+
+        The container's output is streamed to ``agent.log`` in ``output_dir`` while it
+        runs (see LogStreamWriter for ``max_log_bytes`` and ``log_backups``).
+        If the container is still running after ``timeout`` seconds it is killed; the
+        logs written until then are kept and ``timed_out`` is set. The agent is also
+        killed as soon as one of ``service_containers`` dies or its healthcheck reports
+        it unhealthy (``service_failure``).
+        With ``dev`` the agent code is bind-mounted read-only from the working tree
+        (AGENT_DEV_MOUNTS) on top of a dependency-only image.
+        """
+        log_writer = LogStreamWriter(os.path.join(output_dir, 'agent.log'), max_log_bytes, log_backups)
+        log_thread = None
+        linked_artifacts = None
+        watches = []
+        samplers: Dict[str, ContainerStatsSampler] = {}
+        container_name = self.unique_name(f"agent-{challenge_data['name'].lower().replace(' ', '-')}")
         
         try:
-            # Copy artifacts to temp directory for easier mounting
-            for item in os.listdir(challenge_data['artifacts_folder']):
-                src = os.path.join(challenge_data['artifacts_folder'], item)
-                dst = os.path.join(temp_artifacts, item)
-                if os.path.isdir(src):
-                    shutil.copytree(src, dst)
-                else:
-                    shutil.copy2(src, dst)
+            # Mount the artifacts and the results directory directly, without copies.
+            # Docker's bind syntax cannot express host paths containing ':', so such
+            # artifacts are hardlinked to a temporary path first.
+            artifacts_path = os.path.abspath(challenge_data['artifacts_folder'])
+            if ':' in artifacts_path and os.name != 'nt':
+                linked_artifacts = tempfile.mkdtemp(prefix="ctf_artifacts_")
+                link_tree(artifacts_path, linked_artifacts)
+                artifacts_path = linked_artifacts
             
             # Prepare volumes
             volumes = {
-                temp_output: {'bind': '/app/output', 'mode': 'rw'},
-                temp_artifacts: {'bind': '/app/artifacts', 'mode': 'ro'}
+                os.path.abspath(output_dir): {'bind': '/app/output', 'mode': 'rw'},
+                artifacts_path: {'bind': '/app/artifacts', 'mode': 'ro'},
+                **self._agent_cache_volumes(),
             }
+            if dev:
+                for source, target in AGENT_DEV_MOUNTS.items():
+                    volumes[os.path.abspath(source)] = {'bind': target, 'mode': 'ro'}
             
             # Prepare environment
             environment = {
                 'CHALLENGE_DATA': json.dumps(challenge_data),
-                # Copy LiteLLM environment variables for API access
-                'LITELLM_BASE_URL': os.environ.get('LITELLM_BASE_URL', ''),
-                'LITELLM_API_KEY': os.environ.get('LITELLM_API_KEY', ''),
+                **self._agent_environment(),
             }
             
             # Run the agent container
@@ -152,71 +831,352 @@ class DockerManager:
                 name=container_name,
                 network=network_name,
                 environment=environment,
-                volumes=volumes
+                volumes=volumes,
+                resource_limits=resource_limits
             )
+            log_thread = threading.Thread(target=self._stream_logs, args=(container, log_writer), daemon=True)
+            log_thread.start()
+            samplers['agent'] = ContainerStatsSampler(container, self.logger)
+            for service in service_containers or []:
+                samplers[service.name] = ContainerStatsSampler(service, self.logger)
             
-            # Wait for container to complete
-            result = container.wait()
-            logs = container.logs().decode('utf-8')
-            
-            # Copy results back from temp directory
-            for item in os.listdir(temp_output):
-                src = os.path.join(temp_output, item)
-                dst = os.path.join(output_dir, item)
-                if os.path.isdir(src):
-                    if os.path.exists(dst):
-                        shutil.rmtree(dst)
-                    shutil.copytree(src, dst)
+            # Wait for the agent to exit, killing it once the deadline passes or a service dies or turns unhealthy
+            supervisor = ContainerSupervisor.get()
+            agent_watch = supervisor.watch(container)
+            service_watches = [supervisor.watch(service) for service in service_containers or []]
+            watches = [agent_watch] + service_watches
+            wait([agent_watch.exited] + [w.failed for w in service_watches], timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            timed_out = False
+            service_failure = None
+            if not agent_watch.exited.done():
+                failed_services = [w for w in service_watches if w.failed.done()]
+                if failed_services:
+                    service_failure = f"Service container {failed_services[0].container.name} {failed_services[0].failed.result()} during the run"
+                    self.logger.warning(f"{service_failure}, killing agent {container_name}")
                 else:
-                    shutil.copy2(src, dst)
+                    self.logger.warning(f"Agent container {container_name} exceeded its {timeout:.0f}s timeout, killing it")
+                    timed_out = True
+                try:
+                    container.kill()
+                except Exception as e:
+                    self.logger.error(f"Failed to kill agent container {container_name}: {e}")
+            exit_code = agent_watch.exited.result(timeout=60)
+            log_thread.join(timeout=30)
+            resource_usage = {name: sampler.stop() for name, sampler in samplers.items()}
             
-            # Read results
-            try:
-                with open(os.path.join(output_dir, 'final_result.txt'), 'r') as f:
-                    final_result = json.loads(f.read())
-            except Exception as e:
-                self.logger.error(f"Failed to read final result: {e}")
-                final_result = {'found_flag': None, 'success': False, 'error': 'Failed to read result'}
+            final_result = self._read_final_result(output_dir, timeout if timed_out else None, service_failure)
             
             return {
-                'exit_code': result['StatusCode'],
-                'logs': logs,
+                'exit_code': exit_code,
+                'timed_out': timed_out,
+                'oom_killed': agent_watch.oom_killed,
+                'service_failure': service_failure,
+                'resource_usage': resource_usage,
+                'log_bytes': log_writer.bytes_written,
+                'log_truncated': log_writer.truncated,
                 'result': final_result
             }
             
         except Exception as e:
             self.logger.error(f"Failed to run agent: {e}")
+            log_writer.write(str(e).encode('utf-8'))
             return {
                 'exit_code': -1,
-                'logs': str(e),
+                'timed_out': False,
+                'oom_killed': False,
+                'service_failure': None,
+                'log_bytes': log_writer.bytes_written,
+                'log_truncated': log_writer.truncated,
                 'result': {'found_flag': None, 'success': False, 'error': str(e)}
             }
         finally:
-            # Cleanup temp directories
-            try:
-                shutil.rmtree(temp_output)
-                shutil.rmtree(temp_artifacts)
-            except Exception as e:
-                self.logger.error(f"Failed to cleanup temp directories: {e}")
+            for sampler in samplers.values():
+                sampler.cancel()
+            for watch in watches:
+                ContainerSupervisor.get().unwatch(watch)
+            log_writer.close()
+            if linked_artifacts:
+                try:
+                    shutil.rmtree(linked_artifacts)
+                except Exception as e:
+                    self.logger.error(f"Failed to cleanup linked artifacts: {e}")
     
-    def cleanup(self):
-        """Clean up all containers and networks."""
-        # Stop and remove containers
-        for container in self.containers:
+    def _remove_container(self, container: Any):
+        try:
+            # The daemon only accepts whole seconds for the stop grace period
+            container.stop(timeout=int(self.stop_timeout))
+        except Exception as e:
+            self.logger.warning(f"Failed to stop container {container.name}, removing it anyway: {e}")
+        finally:
             try:
-                container.stop()
-                container.remove()
+                container.remove(force=True)
                 self.logger.info(f"Cleaned up container: {container.name}")
             except Exception as e:
                 self.logger.error(f"Failed to cleanup container {container.name}: {e}")
-        
-        # Remove networks
-        for network in self.networks:
-            try:
-                network.remove()
-                self.logger.info(f"Cleaned up network: {network.name}")
-            except Exception as e:
-                self.logger.error(f"Failed to cleanup network {network.name}: {e}")
+
+    def _remove_network(self, network: Any):
+        try:
+            network.remove()
+            self.logger.info(f"Cleaned up network: {network.name}")
+        except Exception as e:
+            self.logger.error(f"Failed to cleanup network {network.name}: {e}")
+
+    def _remove_image(self, image: Any):
+        try:
+            self.client.images.remove(image.id, force=True)
+            self.logger.info(f"Cleaned up image: {image.tags[0] if image.tags else image.short_id}")
+        except Exception as e:
+            self.logger.error(f"Failed to cleanup image {image.short_id}: {e}")
+
+    def cleanup(self):
+        """Clean up all containers, then all networks, each concurrently."""
+        _run_concurrently(self._remove_container, self.containers)
+        _run_concurrently(self._remove_network, self.networks)
         
         self.containers.clear()
-        self.networks.clear()
\ No newline at end of file
+        self.networks.clear()
+
+    def collect_garbage(self, all_runs: bool = False) -> Dict[str, int]:
+        """
+        Remove labelled containers, networks and images (service pool snapshots)
+        left behind by runs whose process is gone (same host, dead pid). With
+        ``all_runs`` every labelled resource is removed, including those of live
+        runs and other hosts. Agent images are removed unless they are tagged for
+        the current sources (see ``agent_image_tag``), whichever run built them.
+        """
+        hostname = socket.gethostname()
+        live_pids: Dict[str, bool] = {}
+        
+        def is_orphan(labels: Dict[str, str]) -> bool:
+            if all_runs:
+                return True
+            pid = labels.get(PID_LABEL, '')
+            if labels.get(HOST_LABEL) != hostname or not pid.isdigit() or int(pid) == os.getpid():
+                return False
+            if pid not in live_pids:
+                live_pids[pid] = _process_alive(int(pid))
+            return not live_pids[pid]
+        
+        label_filter = {'label': f"{MANAGED_LABEL}=true"}
+        containers = [c for c in self.client.containers.list(all=True, filters=label_filter) if is_orphan(c.labels)]
+        _run_concurrently(self._remove_container, containers)
+        networks = [n for n in self.client.networks.list(filters=label_filter) if is_orphan(n.attrs.get('Labels') or {})]
+        _run_concurrently(self._remove_network, networks)
+        # Images last, once no container uses them any more: snapshots of dead runs,
+        # and agent images built from sources other than the current ones
+        current_agent_images = {agent_image_tag(), agent_image_tag(dev=True)}
+        images, agent_images = [], []
+        for image in self.client.images.list(filters=label_filter):
+            labels = image.labels or {}
+            if AGENT_IMAGE_LABEL in labels:
+                if not current_agent_images.intersection(image.tags):
+                    agent_images.append(image)
+            elif is_orphan(labels):
+                images.append(image)
+        _run_concurrently(self._remove_image, images + agent_images)
+        
+        self.logger.info(f"Garbage collected {len(containers)} containers, {len(networks)} networks, {len(images)} images "
+                         f"and {len(agent_images)} stale agent images")
+        return {'containers': len(containers), 'networks': len(networks), 'images': len(images), 'agent_images': len(agent_images)}
+
+
+class AgentWorker:
+    """
+    A warm agent container running ``run_agent.py --serve`` that solves challenges
+    one job at a time, so each challenge skips container start-up, interpreter
+    start-up and imports.
+
+    The worker only has its own job directory mounted. For each job the host
+    hardlinks the challenge artifacts and any existing output (e.g. a cassette to
+    replay) into ``<job_id>/``, and once the job is done moves the output back to
+    the challenge output directory and removes the job's files. The worker's
+    ``agent.log`` is streamed to the output directory through a LogStreamWriter
+    while the job runs. Between jobs the worker resets its workdir. Resource
+    limits are those the worker was started with. A job that overruns its timeout,
+    or whose service dies or turns unhealthy, kills the worker; ``alive`` then turns False.
+    """
+    JOBS_MOUNT = '/app/jobs'
+    JOBS_DIR_NAME = '.agent-jobs'
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, docker_manager: DockerManager, container: Any, jobs_dir: str):
+        self.docker_manager = docker_manager
+        self.container = container
+        self.jobs_dir = jobs_dir
+        self.watch = ContainerSupervisor.get().watch(container)
+        self.jobs_run = 0
+
+    @property
+    def alive(self) -> bool:
+        return not self.watch.exited.done()
+
+    def _collect_output(self, job_output: str, output_dir: str):
+        for name in os.listdir(job_output):
+            # agent.log has already been streamed to the output directory
+            if name != 'agent.log':
+                os.replace(os.path.join(job_output, name), os.path.join(output_dir, name))
+
+    def run_job(self, challenge_data: Dict, output_dir: str, timeout: Optional[float] = None,
+                service_containers: Optional[List[Any]] = None, max_log_bytes: Optional[int] = None,
+                log_backups: int = 0) -> Dict:
+        """Run one challenge on this worker; returns the same structure as DockerManager.run_agent."""
+        logger = self.docker_manager.logger
+        job_id = f"{int(time.time() * 1000):015d}-{uuid.uuid4().hex[:8]}"
+        job_root = os.path.join(self.jobs_dir, job_id)
+        log_writer = LogStreamWriter(os.path.join(output_dir, 'agent.log'), max_log_bytes, log_backups)
+        job_log = None
+        supervisor = ContainerSupervisor.get()
+        service_watches = [supervisor.watch(service) for service in service_containers or []]
+        samplers = {'agent': ContainerStatsSampler(self.container, logger)}
+        for service in service_containers or []:
+            samplers[service.name] = ContainerStatsSampler(service, logger)
+        
+        def pump_log():
+            nonlocal job_log
+            if job_log is None:
+                try:
+                    job_log = open(os.path.join(job_root, 'output', 'agent.log'), 'rb')
+                except FileNotFoundError:
+                    return
+            chunk = job_log.read()
+            if chunk:
+                log_writer.write(chunk)
+        
+        try:
+            # Give the job its own copy of the artifacts and of anything already in its output directory
+            link_tree(os.path.abspath(challenge_data['artifacts_folder']), os.path.join(job_root, 'artifacts'))
+            link_tree(output_dir, os.path.join(job_root, 'output'))
+            # The worker writes a fresh log there; the one in output_dir belongs to log_writer
+            os.remove(os.path.join(job_root, 'output', 'agent.log'))
+            job = {
+                'challenge_data': challenge_data,
+                'artifacts_folder': f"{self.JOBS_MOUNT}/{job_id}/artifacts",
+                'output_dir': f"{self.JOBS_MOUNT}/{job_id}/output",
+            }
+            job_path = os.path.join(self.jobs_dir, f"{job_id}.json")
+            with open(f"{job_path}.tmp", 'w') as f:
+                json.dump(job, f)
+            os.replace(f"{job_path}.tmp", job_path)
+            logger.info(f"Submitted job {job_id} to agent worker {self.container.name}")
+            
+            # Wait for the job to finish, the worker to die, a service to fail or the deadline
+            deadline = time.time() + timeout if timeout is not None else None
+            done_path = os.path.join(self.jobs_dir, f"{job_id}.done")
+            timed_out = False
+            service_failure = None
+            while not os.path.exists(done_path):
+                pump_log()
+                if not self.alive:
+                    break
+                failed_services = [w for w in service_watches if w.failed.done()]
+                if failed_services:
+                    service_failure = f"Service container {failed_services[0].container.name} {failed_services[0].failed.result()} during the run"
+                    break
+                if deadline is not None and time.time() > deadline:
+                    timed_out = True
+                    break
+                wait([self.watch.exited] + [w.failed for w in service_watches],
+                     timeout=self.POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            
+            completed = os.path.exists(done_path)
+            if not completed and self.alive:
+                # The job cannot be interrupted inside the worker, so the worker goes
+                if timed_out:
+                    logger.warning(f"Job {job_id} exceeded its {timeout:.0f}s timeout, killing agent worker {self.container.name}")
+                else:
+                    logger.warning(f"{service_failure}, killing agent worker {self.container.name}")
+                self.container.kill()
+            if completed:
+                os.remove(done_path)
+                self.jobs_run += 1
+            pump_log()
+            self._collect_output(os.path.join(job_root, 'output'), output_dir)
+            
+            resource_usage = {name: sampler.stop() for name, sampler in samplers.items()}
+            return {
+                'exit_code': 0 if completed else self.watch.exited.result(timeout=60),
+                'timed_out': timed_out,
+                'oom_killed': self.watch.oom_killed,
+                'service_failure': service_failure,
+                'resource_usage': resource_usage,
+                'log_bytes': log_writer.bytes_written,
+                'log_truncated': log_writer.truncated,
+                'result': self.docker_manager._read_final_result(output_dir, timeout if timed_out else None, service_failure),
+                'agent_worker': {'name': self.container.name, 'jobs_run': self.jobs_run},
+            }
+        except Exception as e:
+            logger.error(f"Failed to run job on agent worker {self.container.name}: {e}")
+            log_writer.write(str(e).encode('utf-8'))
+            return {
+                'exit_code': -1,
+                'timed_out': False,
+                'oom_killed': False,
+                'service_failure': None,
+                'log_bytes': log_writer.bytes_written,
+                'log_truncated': log_writer.truncated,
+                'result': {'found_flag': None, 'success': False, 'error': str(e)}
+            }
+        finally:
+            for sampler in samplers.values():
+                sampler.cancel()
+            for watch in service_watches:
+                supervisor.unwatch(watch)
+            if job_log:
+                job_log.close()
+            log_writer.close()
+            shutil.rmtree(job_root, ignore_errors=True)
+
+    def close(self):
+        """Stop supervising the worker and remove its job directory; the container is removed by its manager's cleanup."""
+        ContainerSupervisor.get().unwatch(self.watch)
+        shutil.rmtree(self.jobs_dir, ignore_errors=True)
+
+
+class AgentWorkerPool:
+    """
+    Warm agent workers for challenges without services. All of them share one
+    network that has nothing else on it; each worker serves one job at a time.
+    """
+    def __init__(self, results_root: str, run_id: Optional[str] = None,
+                 stop_timeout: int = DEFAULT_STOP_TIMEOUT, resource_limits: Optional[Dict[str, Any]] = None,
+                 dev: bool = False, logger: Optional[logging.Logger] = None):
+        self.results_root = results_root
+        self.resource_limits = resource_limits
+        self.dev = dev
+        self.docker_manager = DockerManager(logger or logging.getLogger("agent_workers"), run_id=run_id,
+                                            stop_timeout=stop_timeout)
+        self.network_name = None
+        self._idle: List[AgentWorker] = []
+        self._workers: List[AgentWorker] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, image_tag: str) -> AgentWorker:
+        """Take an idle live worker, or start a new one from ``image_tag``."""
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive:
+                    return worker
+            if self.network_name is None:
+                self.network_name = self.docker_manager.unique_name("ctf-network-agent-workers")
+                self.docker_manager.create_network(self.network_name)
+            worker = self.docker_manager.start_agent_worker(
+                self.network_name, image_tag, self.results_root,
+                resource_limits=self.resource_limits, dev=self.dev
+            )
+            self._workers.append(worker)
+            return worker
+
+    def release(self, worker: AgentWorker):
+        with self._lock:
+            if worker.alive:
+                self._idle.append(worker)
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
+            self._workers.clear()
+            self._idle.clear()
+        self.docker_manager.cleanup()
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+
+
+# Responses are stored one file per key under this subdirectory, sharded by key prefix
+CACHE_DIR_NAME = "llm-responses"
+DEFAULT_CACHE_MAX_BYTES = int(float(os.getenv('LITELLM_CACHE_MAX_MB', 512)) * 1024 * 1024)
+DEFAULT_CACHE_MAX_AGE = float(os.getenv('LITELLM_CACHE_MAX_AGE', 7 * 24 * 3600))
+# The directory is scanned for eviction each time this fraction of max_bytes has been written
+EVICTION_CHECK_FRACTION = 16
+# Temporary files left by a writer that died before renaming them
+STALE_TEMP_AGE = 3600
+
+
+class LLMResponseCache:
+    '''
+    Content-addressed on-disk cache of chat completion responses.
+
+    Entries are keyed by a hash of the canonical JSON of the model, messages and
+    generation kwargs, and stored as one file per key in `directory`. A file is
+    written to a temporary name and moved into place with `os.replace`, so
+    readers see either the whole response or none, without any locking. That
+    makes the cache safe to share between threads, processes and agent
+    containers that bind-mount the same directory, including through Docker
+    Desktop's VM file sharing, where SQLite's locks and shared memory do not work.
+
+    A file's modification time is its creation time and its access time is set
+    on every hit. Entries older than `max_age` seconds are dropped, and the least
+    recently used entries are evicted once the stored responses exceed
+    `max_bytes` (checked by each writer every `max_bytes / 16` bytes written, so
+    concurrent writers may overshoot it slightly).
+    '''
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES, max_age: float = DEFAULT_CACHE_MAX_AGE):
+        self.path = os.path.join(directory, CACHE_DIR_NAME)
+        os.makedirs(self.path, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._unchecked_bytes = 0
+
+    def __str__(self) -> str:
+        return f"LLMResponseCache(path={self.path}, max_bytes={self.max_bytes}, hits={self.hits}, misses={self.misses})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @staticmethod
+    def key(model: str, messages: Any, kwargs: dict) -> str:
+        '''
+        Canonical hash of a request: identical requests map to the same key
+        regardless of dict ordering.
+        '''
+        canonical = json.dumps({"model": model, "messages": messages, "kwargs": kwargs},
+                               sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[str]:
+        '''
+        The cached response JSON for `key`, or None on a miss or an expired entry.
+        '''
+        path = self._entry_path(key)
+        now = time.time()
+        try:
+            created_at = os.stat(path).st_mtime
+            if created_at < now - self.max_age:
+                self._count(False)
+                return None
+            with open(path, 'r') as f:
+                response_json = f.read()
+            os.utime(path, (now, created_at))
+        except FileNotFoundError:
+            # Never written, or evicted by another process in between
+            self._count(False)
+            return None
+        self._count(True)
+        return response_json
+
+    def put(self, key: str, model: str, response_json: str):
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(response_json)
+            # Readable by agents running as another user on the same mount
+            os.chmod(temp_path, 0o644)
+            now = time.time()
+            os.utime(temp_path, (now, now))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._lock:
+            self._unchecked_bytes += len(response_json)
+            if self._unchecked_bytes < self.max_bytes // EVICTION_CHECK_FRACTION:
+                return
+            self._unchecked_bytes = 0
+        self._evict(time.time())
+
+    def _entries(self):
+        '''
+        (path, size, accessed_at, created_at) of every entry, removing temporary
+        files abandoned by writers that died.
+        '''
+        now = time.time()
+        for shard in os.scandir(self.path):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                    if entry.name.startswith("."):
+                        if stat.st_mtime < now - STALE_TEMP_AGE:
+                            os.remove(entry.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_size, stat.st_atime, stat.st_mtime
+
+    def _evict(self, now: float):
+        total, live = 0, []
+        for path, size, accessed_at, created_at in self._entries():
+            if created_at < now - self.max_age:
+                self._remove(path)
+                continue
+            total += size
+            live.append((accessed_at, size, path))
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(live):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        sizes = [size for _, size, _, _ in self._entries()]
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "entries": len(sizes),
+            "bytes": sum(sizes),
+            "hits": hits,
+            "misses": misses,
+        }
+
+    def close(self):
+        '''
+        Nothing is held open between calls; kept so callers can close any cache.
+        '''
+        pass
+
+
+def load_cache() -> Optional[LLMResponseCache]:
+    '''
+    The cache in the directory named by the LITELLM_CACHE_DIR environment variable,
+    or None when caching is off.
+    '''
+    directory = os.getenv('LITELLM_CACHE_DIR')
+    return LLMResponseCache(directory) if directory else None
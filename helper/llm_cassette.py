@@ -0,0 +1,118 @@
+import difflib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from openai.types.chat.chat_completion import ChatCompletion
+
+from helper.llm_cache import LLMResponseCache
+
+
+CASSETTE_FILE_NAME = "cassette.jsonl"
+CASSETTE_MODES = ('record', 'replay')
+MISMATCH_POLICIES = ('strict', 'nearest', 'passthrough')
+
+
+class CassetteMismatchError(Exception):
+    """Raised in strict replay when a request has no matching recorded interaction."""
+
+
+class Cassette:
+    '''
+    Record/replay of the chat completions made through a LiteLLMManager.
+
+    In `record` mode every request/response pair is appended to a JSONL file as it
+    happens. In `replay` mode responses are served from that file without any
+    network access: a request gets the next unused recording with the same
+    canonical key (model, messages and kwargs, as in LLMResponseCache). When there
+    is none, the `mismatch` policy decides:
+
+    - `strict`: raise CassetteMismatchError
+    - `nearest`: use the recording for the same model whose messages are most
+      similar, preferring unused ones
+    - `passthrough`: return None so the caller makes the request live
+    '''
+    def __init__(self, path: str, mode: str, mismatch: str = 'strict'):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {CASSETTE_MODES}")
+        if mismatch not in MISMATCH_POLICIES:
+            raise ValueError(f"Unknown mismatch policy '{mismatch}', expected one of {MISMATCH_POLICIES}")
+        self.path = path
+        self.mode = mode
+        self.mismatch = mismatch
+        self._lock = threading.Lock()
+        self.interactions: List[Dict[str, Any]] = []
+        self._used: set[int] = set()
+        if mode == 'replay':
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cassette {path} not found")
+            with open(path, 'r') as f:
+                self.interactions = [json.loads(line) for line in f if line.strip()]
+
+    def __str__(self) -> str:
+        return f"Cassette(path={self.path}, mode={self.mode}, mismatch={self.mismatch}, interactions={len(self.interactions)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def record(self, model: str, messages: Any, kwargs: dict, response: ChatCompletion):
+        interaction = {
+            "key": LLMResponseCache.key(model, messages, kwargs),
+            "model": model,
+            "messages": messages,
+            "kwargs": kwargs,
+            "response": response.model_dump(mode='json'),
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(interaction, default=str) + "\n")
+
+    def _nearest(self, model: str, messages: Any) -> Optional[int]:
+        target = json.dumps(messages, sort_keys=True, default=str)
+        candidates = [i for i, interaction in enumerate(self.interactions) if interaction['model'] == model]
+        if not candidates:
+            return None
+        unused = [i for i in candidates if i not in self._used]
+        return max(unused or candidates, key=lambda i: difflib.SequenceMatcher(
+            None, target, json.dumps(self.interactions[i]['messages'], sort_keys=True, default=str)
+        ).ratio())
+
+    def replay(self, model: str, messages: Any, kwargs: dict) -> Optional[ChatCompletion]:
+        '''
+        The recorded response for this request, or None to make it live (passthrough).
+        '''
+        key = LLMResponseCache.key(model, messages, kwargs)
+        with self._lock:
+            index = next((i for i, interaction in enumerate(self.interactions)
+                          if interaction['key'] == key and i not in self._used), None)
+            if index is None and self.mismatch == 'nearest':
+                index = self._nearest(model, messages)
+            if index is None:
+                if self.mismatch == 'passthrough':
+                    return None
+                raise CassetteMismatchError(f"No recorded {model} interaction matches request {key[:12]} in {self.path}")
+            self._used.add(index)
+            return ChatCompletion.model_validate(self.interactions[index]['response'])
+
+
+def load_cassette(directory: str) -> Optional[Cassette]:
+    '''
+    The cassette in `directory` for the mode in LITELLM_CASSETTE_MODE (with the
+    policy in LITELLM_CASSETTE_MISMATCH), or None when record/replay is off. With
+    the `passthrough` policy a missing or unreadable cassette also gives None, so
+    every call is made live.
+    '''
+    mode = os.getenv('LITELLM_CASSETTE_MODE')
+    if not mode:
+        return None
+    mismatch = os.getenv('LITELLM_CASSETTE_MISMATCH', 'strict')
+    try:
+        return Cassette(os.path.join(directory, CASSETTE_FILE_NAME), mode, mismatch)
+    except (OSError, ValueError) as e:
+        if mode != 'replay' or mismatch != 'passthrough':
+            raise
+        logging.warning(f"Cannot replay cassette, making all calls live: {e}")
+        return None
@@ -1,24 +1,278 @@
+import asyncio
+import collections
+import itertools
 import openai
-from openai.types.chat.chat_completion import ChatCompletion
-from openai.types.chat import ChatCompletionMessageParam
+from openai.types.chat.chat_completion import ChatCompletion, Choice
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageParam
+from openai.types.completion_usage import CompletionUsage
 import dotenv
+import httpx
+import json
 import os
-import requests
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from IPython import embed
-from time import sleep
+from time import sleep, time
+
+from helper.llm_cache import LLMResponseCache, load_cache
+from helper.llm_cassette import Cassette
+from helper.llm_history import DEFAULT_HISTORY_SIZE, Transcript, message_hash
+from helper.llm_pricing import PriceTable, load_price_table
+from helper.llm_ratelimit import RateLimiter, RetryPolicy, estimate_tokens, get_shared_rate_limiter
 
 dotenv.load_dotenv()
 
+# Sized so that many agents (threads or --jobs) can share one pool without queueing
+DEFAULT_MAX_CONNECTIONS = int(os.getenv('LITELLM_MAX_CONNECTIONS', 100))
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LITELLM_MAX_KEEPALIVE_CONNECTIONS', 20))
+DEFAULT_KEEPALIVE_EXPIRY = float(os.getenv('LITELLM_KEEPALIVE_EXPIRY', 60.0))
+DEFAULT_HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+# Default cap on requests in flight for AsyncLiteLLMClient.call_many
+DEFAULT_MAX_CONCURRENCY = 8
+
+FINISH_REASONS = ("stop", "length", "tool_calls", "content_filter", "function_call")
+
+
+class HTTPConnectionPool:
+    '''
+    One keep-alive httpx connection pool shared by every LLM client and API helper.
+
+    Counts requests, newly opened connections and connections in use (through
+    httpcore's trace hook), so `stats()` shows how many requests reused a pooled
+    connection.
+    '''
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+                 timeout: httpx.Timeout = DEFAULT_HTTP_TIMEOUT):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.connections_in_use = 0
+        self.client = httpx.Client(
+            limits=self.limits,
+            timeout=timeout,
+            follow_redirects=True,
+            event_hooks={'request': [self._on_request]}
+        )
+
+    def __str__(self) -> str:
+        return f"HTTPConnectionPool(max_connections={self.limits.max_connections}, requests={self.requests}, connections_opened={self.connections_opened})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def _on_request(self, request: httpx.Request):
+        with self._lock:
+            self.requests += 1
+        request.extensions['trace'] = self._trace
 
-class LiteLLMClient:
+    def _trace(self, event_name: str, info: dict):
+        if event_name == 'connection.connect_tcp.complete':
+            with self._lock:
+                self.connections_opened += 1
+        elif event_name.endswith('.send_request_headers.started'):
+            with self._lock:
+                self.connections_in_use += 1
+        elif event_name.endswith('.response_closed.complete'):
+            with self._lock:
+                self.connections_in_use = max(self.connections_in_use - 1, 0)
+
+    def _pooled_connections(self) -> list | None:
+        # httpx has no public API for the pool's connections; None if its internals change
+        try:
+            return [connection.is_idle() for connection in self.client._transport._pool.connections]
+        except Exception:
+            return None
+
+    def stats(self) -> dict:
+        '''
+        Requests sent, connections opened, reused and in use, and connections
+        currently in the pool (None when the pool cannot be inspected).
+        '''
+        with self._lock:
+            requests_sent = self.requests
+            connections_opened = self.connections_opened
+            connections_in_use = self.connections_in_use
+        idle = self._pooled_connections()
+        return {
+            'requests': requests_sent,
+            'connections_opened': connections_opened,
+            'connections_reused': max(requests_sent - connections_opened, 0),
+            'connections_in_use': connections_in_use,
+            'connections_open': len(idle) if idle is not None else None,
+            'connections_idle': sum(idle) if idle is not None else None,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+        }
+
+    def create_async_client(self) -> httpx.AsyncClient:
+        '''
+        An async client with the same limits, counted in the same statistics. Async
+        connections belong to one event loop, so every async LLM client gets its own.
+        '''
+        async def on_request(request: httpx.Request):
+            with self._lock:
+                self.requests += 1
+            request.extensions['trace'] = self._atrace
+
+        return httpx.AsyncClient(
+            limits=self.limits,
+            timeout=self.timeout,
+            follow_redirects=True,
+            event_hooks={'request': [on_request]}
+        )
+
+    async def _atrace(self, event_name: str, info: dict):
+        self._trace(event_name, info)
+
+    def close(self):
+        self.client.close()
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool() -> HTTPConnectionPool:
+    '''
+    The process-wide connection pool, created on first use with the default limits.
+    '''
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = HTTPConnectionPool()
+        return _shared_pool
+
+
+class BaseLiteLLMClient:
+    '''
+    Request tracking shared by the sync and async clients: cassette and cache
+    lookups, history, and usage recording on the manager.
+
+    `history` is a ring buffer of the last `history_size` calls as compact records
+    (request id, model, token counts, latency, message hashes, throttling stats);
+    full requests and responses go to the manager's transcript on disk, if any.
+    '''
     def __init__(self, lite_llm_manager: 'LiteLLMManager'):
         self.lite_llm_manager = lite_llm_manager
+        self.history = collections.deque(maxlen=lite_llm_manager.history_size)
+
+    def _lookup(self, model, messages, kwargs) -> tuple[ChatCompletion | None, str | None]:
+        '''
+        A response from the cassette (replay mode) or the response cache, with its source.
+        '''
+        cassette = self.lite_llm_manager.cassette
+        if cassette and cassette.mode == 'replay':
+            replayed = cassette.replay(model, messages, kwargs)
+            if replayed is not None:
+                return replayed, 'cassette'
+        cache = self.lite_llm_manager.cache
+        cached = cache.get(cache.key(model, messages, kwargs)) if cache else None
+        if cached is not None:
+            return ChatCompletion.model_validate_json(cached), 'cache'
+        return None, None
+
+    def _send(self, create, model, messages, kwargs) -> tuple:
+        '''
+        Send a request through the manager's rate limiter, retrying transient errors
+        per its retry policy. Returns the result of `create` and the call's
+        throttling stats (time waited on the limiter, retries and time spent
+        backing off), which end up in the history and usage record.
+        '''
+        manager = self.lite_llm_manager
+        stats = {"estimated_tokens": estimate_tokens(messages, kwargs), "rate_limit_wait": 0.0, "retries": 0, "retry_wait": 0.0}
+        for attempt in itertools.count():
+            stats["rate_limit_wait"] += manager.rate_limiter.acquire(model, stats["estimated_tokens"])
+            try:
+                return create(model=model, messages=messages, **kwargs), stats
+            except Exception as e:
+                delay = manager.retry_policy.delay(e, attempt)
+                if delay is None:
+                    raise
+                logging.warning(f"LLM request to {model} failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                stats["retries"] += 1
+                stats["retry_wait"] += delay
+                sleep(delay)
+
+    async def _asend(self, create, model, messages, kwargs) -> tuple:
+        '''
+        Async version of `_send`.
+        '''
+        manager = self.lite_llm_manager
+        stats = {"estimated_tokens": estimate_tokens(messages, kwargs), "rate_limit_wait": 0.0, "retries": 0, "retry_wait": 0.0}
+        for attempt in itertools.count():
+            limiter_wait = manager.rate_limiter.reserve(model, stats["estimated_tokens"])
+            if limiter_wait > 0:
+                await asyncio.sleep(limiter_wait)
+            stats["rate_limit_wait"] += limiter_wait
+            try:
+                return await create(model=model, messages=messages, **kwargs), stats
+            except Exception as e:
+                delay = manager.retry_policy.delay(e, attempt)
+                if delay is None:
+                    raise
+                logging.warning(f"LLM request to {model} failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                stats["retries"] += 1
+                stats["retry_wait"] += delay
+                await asyncio.sleep(delay)
+
+    def _track(self, params: dict, response: ChatCompletion, source: str | None, **details):
+        usage = getattr(response, 'usage', None)
+        if 'estimated_tokens' in details and usage is not None:
+            self.lite_llm_manager.rate_limiter.settle(params['model'], details['estimated_tokens'], usage.total_tokens)
+
+        cassette = self.lite_llm_manager.cassette
+        if cassette and cassette.mode == 'record':
+            cassette.record(params['model'], params['messages'],
+                            {k: v for k, v in params.items() if k not in ('model', 'messages')}, response)
+
+        record = {
+            "request_id": getattr(response, 'id', None),
+            "model": params['model'],
+            "prompt_tokens": getattr(usage, 'prompt_tokens', None),
+            "completion_tokens": getattr(usage, 'completion_tokens', None),
+            "message_hashes": [message_hash(message) for message in params['messages']],
+            "cache_hit": source == 'cache',
+            "replayed": source == 'cassette',
+            **details
+        }
+        self.history.append(record)
+        transcript = self.lite_llm_manager.transcript
+        if transcript:
+            transcript.append({
+                **record,
+                "request": params,
+                "response": response.model_dump(mode='json'),
+            })
+
+        # Track request ID and locally computed cost; cache hits and replays cost nothing
+        if source == 'cache':
+            self.lite_llm_manager.record_cache_hit()
+        elif getattr(response, 'id', None):
+            usage_record = self.lite_llm_manager.record_usage(response, replayed=source == 'cassette')
+            usage_record.update(details)
+
+
+class LiteLLMClient(BaseLiteLLMClient):
+    def __init__(self, lite_llm_manager: 'LiteLLMManager'):
+        super().__init__(lite_llm_manager)
         self.instance = openai.OpenAI(
-            base_url=os.getenv('LITELLM_BASE_URL'),
-            api_key=os.getenv('LITELLM_API_KEY')
+            base_url=lite_llm_manager.base_url,
+            api_key=lite_llm_manager.api_key,
+            http_client=lite_llm_manager.http_pool.client,
+            # Retries are done by the manager's retry policy
+            max_retries=0
         )
-        self.history = []
 
     
     def call(self, model, messages: list[ChatCompletionMessageParam], **kwargs) -> ChatCompletion:
@@ -27,24 +281,19 @@ class LiteLLMClient:
             "messages": messages,
             **kwargs
         }
+        start = time()
         
-        response = self.instance.chat.completions.create(
-            model=model,
-            messages=messages,
-            **kwargs
-        )
-
-        self.history.append({
-            "request": params,
-            "response": response
-        })
-
-        # Track request ID for cost calculation
-        if hasattr(response, 'id') and response.id is not None:
-            self.lite_llm_manager.llm_requests.append(response.id)
+        # Replay from a cassette, then the response cache, before going to the network
+        response, source = self._lookup(model, messages, kwargs)
+        stats = {}
+        if response is None:
+            response, stats = self._send(self.instance.chat.completions.create, model, messages, kwargs)
+        self._track(params, response, source, latency=time() - start, **stats)
             
         if len(response.choices) == 0 or response.choices[0].message.content is None:
             raise ValueError("No valid response from LLM")
+        if self.lite_llm_manager.cache and source is None:
+            self.lite_llm_manager.cache.put(self.lite_llm_manager.cache.key(model, messages, kwargs), model, response.model_dump_json())
         return response
     
     # baby wrapper
@@ -56,21 +305,235 @@ class LiteLLMClient:
             ],
             **kwargs
         )
+
+    def stream(self, model, messages: list[ChatCompletionMessageParam], stop_when=None, **kwargs) -> 'LLMStream':
+        '''
+        Stream a completion. Iterate the returned LLMStream for content deltas; it
+        records time to first token and is tracked like `call` once it ends.
+        `stop_when` is a predicate on the content so far, or a compiled regex, that
+        ends the stream (and the generation) as soon as it matches; `stop` keeps its
+        API meaning (stop sequences) and is sent with the other kwargs.
+        '''
+        return LLMStream(self, model, messages, stop_when, kwargs)
+
+    def simple_stream(self, model, prompt: str, stop_when=None, **kwargs) -> 'LLMStream':
+        return self.stream(
+            model=model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            stop_when=stop_when,
+            **kwargs
+        )
+
+class LLMStream:
+    '''
+    Iterator over the content deltas of a streamed chat completion.
+
+    Usage is requested with the final chunk; if the stream is stopped early the
+    proxy never sends it, so token counts are estimated from the text (about 4
+    characters per token) and the usage record is marked `usage_estimated`.
+    Responses from a cassette or the cache are yielded as a single delta.
+    '''
+    def __init__(self, client: LiteLLMClient, model, messages, stop_when, kwargs: dict):
+        self.client = client
+        self.model = model
+        self.messages = messages
+        self.kwargs = kwargs
+        self.stop_when = stop_when.search if hasattr(stop_when, 'search') else stop_when
+        self.content = ""
+        self.time_to_first_token = None
+        self.duration = None
+        self.stopped_early = False
+        self.response = None
+
+    def __str__(self) -> str:
+        return f"LLMStream(model={self.model}, time_to_first_token={self.time_to_first_token}, stopped_early={self.stopped_early}, chars={len(self.content)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __iter__(self):
+        params = {
+            "model": self.model,
+            "messages": self.messages,
+            **self.kwargs
+        }
+        start = time()
+        response, source = self.client._lookup(self.model, self.messages, self.kwargs)
+        if response is not None:
+            self.content = (response.choices[0].message.content or "") if response.choices else ""
+            self.time_to_first_token = time() - start
+            self.response = response
+            try:
+                if self.content:
+                    yield self.content
+            finally:
+                self.duration = time() - start
+                self.client._track(params, response, source, latency=self.duration,
+                                   time_to_first_token=self.time_to_first_token)
+            return
+
+        stream, stats = self.client._send(self.client.instance.chat.completions.create, self.model, self.messages,
+                                          {**self.kwargs, "stream": True, "stream_options": {"include_usage": True}})
+        response_id, response_model, created, finish_reason, usage = None, self.model, int(start), None, None
+        parts = []
+        try:
+            for chunk in stream:
+                response_id = response_id or chunk.id
+                response_model = chunk.model or response_model
+                created = chunk.created or created
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time() - start
+                parts.append(delta)
+                self.content = "".join(parts)
+                yield delta
+                if self.stop_when and self.stop_when(self.content):
+                    self.stopped_early = True
+                    break
+        finally:
+            # Closing the stream drops the connection, which ends the generation upstream
+            stream.close()
+            self.duration = time() - start
+            if usage is None:
+                usage = CompletionUsage(
+                    prompt_tokens=len(json.dumps(self.messages, default=str)) // 4,
+                    completion_tokens=len(self.content) // 4,
+                    total_tokens=(len(json.dumps(self.messages, default=str)) + len(self.content)) // 4
+                )
+                estimated = {"usage_estimated": True}
+            else:
+                estimated = {}
+            self.response = ChatCompletion(
+                id=response_id or "",
+                object="chat.completion",
+                created=created,
+                model=response_model,
+                choices=[Choice(
+                    index=0,
+                    finish_reason=finish_reason if finish_reason in FINISH_REASONS else "stop",
+                    message=ChatCompletionMessage(role="assistant", content=self.content)
+                )],
+                usage=usage
+            )
+            self.client._track(params, self.response, None, latency=self.duration,
+                               time_to_first_token=self.time_to_first_token,
+                               stopped_early=self.stopped_early, **stats, **estimated)
+            cache = self.client.lite_llm_manager.cache
+            if cache and self.content and not self.stopped_early and finish_reason is not None:
+                cache.put(cache.key(self.model, self.messages, self.kwargs), self.model, self.response.model_dump_json())
+
+    def read(self) -> str:
+        '''
+        Consume the stream and return the content (up to the stop match, if any).
+        '''
+        for _ in self:
+            pass
+        return self.content
         
 
+class AsyncLiteLLMClient(BaseLiteLLMClient):
+    '''
+    Async counterpart of LiteLLMClient built on openai.AsyncOpenAI. Calls are
+    tracked by the same manager (llm_requests, costs, cache, cassette) and kept in
+    the same history format.
+    '''
+    def __init__(self, lite_llm_manager: 'LiteLLMManager'):
+        super().__init__(lite_llm_manager)
+        self.instance = openai.AsyncOpenAI(
+            base_url=lite_llm_manager.base_url,
+            api_key=lite_llm_manager.api_key,
+            http_client=lite_llm_manager.http_pool.create_async_client(),
+            max_retries=0
+        )
+
+    async def call(self, model, messages: list[ChatCompletionMessageParam], **kwargs) -> ChatCompletion:
+        params = {
+            "model": model,
+            "messages": messages,
+            **kwargs
+        }
+        start = time()
+
+        response, source = self._lookup(model, messages, kwargs)
+        stats = {}
+        if response is None:
+            response, stats = await self._asend(self.instance.chat.completions.create, model, messages, kwargs)
+        self._track(params, response, source, latency=time() - start, **stats)
+
+        if len(response.choices) == 0 or response.choices[0].message.content is None:
+            raise ValueError("No valid response from LLM")
+        if self.lite_llm_manager.cache and source is None:
+            self.lite_llm_manager.cache.put(self.lite_llm_manager.cache.key(model, messages, kwargs), model, response.model_dump_json())
+        return response
+
+    async def simple_call(self, model, prompt: str, **kwargs) -> ChatCompletion:
+        return await self.call(
+            model=model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            **kwargs
+        )
+
+    async def call_many(self, requests: list[str | dict], model=None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                        return_exceptions: bool = False, **kwargs) -> list:
+        '''
+        Run a batch of requests concurrently, at most `max_concurrency` at a time,
+        and return the responses in request order.
+        Each request is a prompt (sent to `model` with `kwargs`) or a dict of `call`
+        arguments. If one request fails the others are cancelled and its error is
+        raised; with `return_exceptions` failures are returned in place instead.
+        Cancelling the awaiting task cancels every request still in flight.
+        '''
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(request):
+            async with semaphore:
+                if isinstance(request, str):
+                    return await self.simple_call(model, request, **kwargs)
+                return await self.call(**{**kwargs, **request})
+
+        if return_exceptions:
+            return await asyncio.gather(*(run(request) for request in requests), return_exceptions=True)
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [group.create_task(run(request)) for request in requests]
+        except ExceptionGroup as errors:
+            raise errors.exceptions[0]
+        return [task.result() for task in tasks]
+
+    async def close(self):
+        await self.instance.close()
+
+
 class LiteLLMManager:
     """
     Manager for LiteLLM API clients with cost tracking and observability.
     
     Features:
-    - Creates and manages multiple LLM clients
-    - Tracks all request IDs for cost calculation
+    - Creates and manages multiple LLM clients, sync and async
+    - Tracks all request IDs with token usage and a cost computed locally from a price table
     - Provides detailed usage analytics
     - Supports both individual and batch cost calculations
-    - Integrates with LiteLLM's cost tracking API
+    - Optionally reconciles local costs with LiteLLM's cost tracking API in the background
+    - Optionally serves repeated requests from an on-disk response cache
+    - Optionally records calls to, or replays them from, a cassette file
+    - Keeps a bounded per-client history and spills full payloads to a JSONL transcript
+    - Shares one keep-alive HTTP connection pool across all clients and API helpers
+    - Throttles requests per model (RPM/TPM) and retries transient errors with backoff
     """
-    clients: list[LiteLLMClient]
+    clients: list[BaseLiteLLMClient]
     llm_requests: list[str]
+    llm_request_usage: dict[str, dict]
     
     @staticmethod
     def list_models(base_url=None, api_key=None):
@@ -78,7 +541,8 @@ class LiteLLMManager:
         api_key = api_key or os.getenv('LITELLM_API_KEY')
         instance = openai.OpenAI(
             base_url=base_url,
-            api_key=api_key
+            api_key=api_key,
+            http_client=get_shared_pool().client
         )
         return [model.id for model in instance.models.list().data]
 
@@ -97,7 +561,7 @@ class LiteLLMManager:
     def get_key_info(base_url=None, api_key=None):
         base_url = base_url or os.getenv('LITELLM_BASE_URL')
         api_key = api_key or os.getenv('LITELLM_API_KEY')
-        response = requests.get(
+        response = get_shared_pool().client.get(
             f"{base_url}/key/info",
             headers={
                 "accept": "application/json",
@@ -115,7 +579,7 @@ class LiteLLMManager:
         api_key = os.getenv('LITELLM_API_KEY')
 
         for _ in range(10):
-            response = requests.get(
+            response = get_shared_pool().client.get(
                 f"{base_url}/spend/logs?request_id={request_id}&summarize=true",
                 headers={
                     "accept": "application/json",
@@ -134,25 +598,101 @@ class LiteLLMManager:
             return data[0]['spend']
         return None
 
-    def __init__(self, base_url=None, api_key=None):
-        base_url = base_url or os.getenv('LITELLM_BASE_URL')
-        api_key = api_key or os.getenv('LITELLM_API_KEY')
+    def __init__(self, base_url=None, api_key=None, http_pool: HTTPConnectionPool | None = None,
+                 price_table: PriceTable | None = None, cache: LLMResponseCache | None = None,
+                 cassette: Cassette | None = None, rate_limiter: RateLimiter | None = None,
+                 retry_policy: RetryPolicy | None = None, transcript: Transcript | None = None,
+                 history_size: int = DEFAULT_HISTORY_SIZE):
+        self.base_url = base_url or os.getenv('LITELLM_BASE_URL')
+        self.api_key = api_key or os.getenv('LITELLM_API_KEY')
+        self.http_pool = http_pool or get_shared_pool()
+        self.price_table = price_table or load_price_table()
+        self.cache = cache or load_cache()
+        self.cache_hits = 0
+        self.cassette = cassette
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.transcript = transcript
+        self.history_size = history_size
         self._cost = 0
+        self._usage_lock = threading.Lock()
         self.clients = []
         self.llm_requests = []
+        self.llm_request_usage = {}
         
     def create_client(self) -> LiteLLMClient:
         client = LiteLLMClient(self)
         self.clients.append(client)
         return client
+
+    def create_async_client(self) -> AsyncLiteLLMClient:
+        client = AsyncLiteLLMClient(self)
+        self.clients.append(client)
+        return client
+        
+    def iter_transcript(self):
+        '''
+        Lazily iterate over the full request/response entries of every call made
+        through this manager's clients. Empty without a transcript.
+        '''
+        return iter(self.transcript) if self.transcript else iter(())
+
+    def get_pool_stats(self) -> dict:
+        '''
+        Statistics of the HTTP connection pool used by this manager's clients.
+        '''
+        return self.http_pool.stats()
         
+    def record_usage(self, response: ChatCompletion, replayed: bool = False) -> dict:
+        '''
+        Record a response's request ID together with its token usage and local cost.
+        A response replayed from a cassette costs nothing; its original cost is kept
+        as `recorded_cost`. Its ID is not added to `llm_requests`, which only lists
+        requests made to the proxy.
+        '''
+        usage = response.usage
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', 0) or 0
+        record = {
+            "model": response.model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cost": self.price_table.cost(response.model, prompt_tokens, completion_tokens, cached_tokens) if usage else None,
+            "price_table_version": self.price_table.version,
+        }
+        if replayed:
+            record["recorded_cost"], record["cost"] = record["cost"], 0.0
+            record["replayed"] = True
+        with self._usage_lock:
+            if not replayed:
+                self.llm_requests.append(response.id)
+            self.llm_request_usage[response.id] = record
+        return record
+
+    def record_cache_hit(self):
+        with self._usage_lock:
+            self.cache_hits += 1
+
+    def get_local_cost(self, request_id: str) -> float | None:
+        '''
+        Cost of a request made through this manager, computed from its usage. None if
+        the request or its model price is unknown.
+        '''
+        record = self.llm_request_usage.get(request_id)
+        return record['cost'] if record else None
+
     def get_cost_for_requests(self, request_ids: list[str]) -> float:
         '''
         Get the total cost for a specific list of LLM request IDs.
+        Requests without a local cost are looked up on the proxy.
         '''
         total_cost = 0
         for request_id in request_ids:
-            cost = self.get_request_cost(request_id)
+            cost = self.get_local_cost(request_id)
+            if cost is None:
+                cost = self.get_request_cost(request_id)
             if cost is not None:
                 total_cost += cost
         return total_cost
@@ -160,12 +700,17 @@ class LiteLLMManager:
     def get_usage_cost(self) -> float:
         '''
         Get the total cost of all LLM calls made through this manager.
+        Instant for models in the price table; others fall back to the proxy's spend logs.
         '''
         if not self.llm_requests:
             return 0.0
             
         total_cost = 0.0
-        for request_id in self.llm_requests:
+        for request_id in list(self.llm_requests):
+            cost = self.get_local_cost(request_id)
+            if cost is not None:
+                total_cost += cost
+                continue
             try:
                 cost = self.get_request_cost(request_id)
                 if cost is not None:
@@ -175,3 +720,182 @@ class LiteLLMManager:
                 logging.warning(f"Could not get cost for request {request_id}: {e}")
                 continue
         return total_cost
+
+    def get_usage_report(self) -> dict:
+        '''
+        Token and cost totals of all LLM calls made through this manager, per model.
+        '''
+        with self._usage_lock:
+            records = list(self.llm_request_usage.values())
+        models = {}
+        for record in records:
+            totals = models.setdefault(record['model'], {
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost": 0.0, "unpriced_requests": 0
+            })
+            totals["requests"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                totals[key] += record[key]
+            if record['cost'] is None:
+                totals["unpriced_requests"] += 1
+            else:
+                totals["cost"] += record['cost']
+        return {
+            "price_table_version": self.price_table.version,
+            "total_cost": sum(totals["cost"] for totals in models.values()),
+            "unpriced_requests": sum(totals["unpriced_requests"] for totals in models.values()),
+            "cache_hits": self.cache_hits,
+            "rate_limit_wait": sum(record.get("rate_limit_wait", 0.0) for record in records),
+            "retries": sum(record.get("retries", 0) for record in records),
+            "retry_wait": sum(record.get("retry_wait", 0.0) for record in records),
+            "models": models,
+        }
+
+
+# Spend logs show up on the proxy a few seconds after a request completes
+RECONCILE_MAX_ATTEMPTS = 10
+RECONCILE_INITIAL_DELAY = 1.0
+RECONCILE_MAX_DELAY = 15.0
+# Longest the host waits for outstanding lookups once the run is over
+RECONCILE_WAIT_TIMEOUT = 120.0
+
+
+class CostReconciler:
+    """
+    Reconciles the cost of LLM requests against the proxy's spend logs in the
+    background, off the agents' critical path.
+
+    Request ids are submitted as challenges finish and collected by a single
+    background thread. Each flush waits a short while for more ids to arrive, then
+    resolves every id still unresolved from one shared date-range spend-log query.
+    Ids missing from it (e.g. logs not written yet) are carried over to the next
+    flush, with the delay between flushes backing off while nothing new arrives.
+    After ``max_attempts`` flushes an id gets one last per-id query, at most
+    ``max_workers`` of them at a time, and is given up on.
+    """
+    def __init__(self, max_workers: int = 4, max_attempts: int = RECONCILE_MAX_ATTEMPTS, base_url=None, api_key=None,
+                 http_pool: HTTPConnectionPool | None = None, logger: logging.Logger | None = None):
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_url = base_url or os.getenv('LITELLM_BASE_URL')
+        self.api_key = api_key or os.getenv('LITELLM_API_KEY')
+        self.http_pool = http_pool or get_shared_pool()
+        self.logger = logger or logging.getLogger(__name__)
+        # The proxy stamps spend logs in UTC; start a day early so no log falls before the range
+        self.start_date = datetime.now(timezone.utc).date() - timedelta(days=1)
+        self.costs: dict[str, float | None] = {}
+        self.range_queries = 0
+        self._seen: set[str] = set()
+        self._attempts: dict[str, int] = {}
+        self._delay = RECONCILE_INITIAL_DELAY
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cost-reconcile", daemon=True)
+        self._thread.start()
+
+    def __str__(self) -> str:
+        return f"CostReconciler(submitted={len(self._seen)}, reconciled={len(self.costs)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def submit(self, request_ids: list[str]):
+        '''
+        Queue request ids for reconciliation; ids already submitted are skipped.
+        '''
+        with self._lock:
+            new_ids = [request_id for request_id in dict.fromkeys(request_ids) if request_id not in self._seen]
+            if not new_ids:
+                return
+            self._seen.update(new_ids)
+            self._attempts.update((request_id, 0) for request_id in new_ids)
+            self._delay = RECONCILE_INITIAL_DELAY
+            self._idle.clear()
+            self._wake.set()
+
+    def _query(self, params: dict) -> list:
+        response = self.http_pool.client.get(
+            f"{self.base_url}/spend/logs",
+            params=params,
+            headers={
+                "accept": "application/json",
+                "x-litellm-api-key": self.api_key
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data if isinstance(data, list) else []
+
+    def _query_one(self, request_id: str):
+        try:
+            logs = self._query({"request_id": request_id, "summarize": "true"})
+            self.costs[request_id] = logs[0].get('spend') if logs and logs[0] else None
+        except Exception as e:
+            self.logger.warning(f"Could not reconcile cost for request {request_id}: {e}")
+            self.costs[request_id] = None
+
+    def _flush(self):
+        with self._lock:
+            pending = set(self._attempts)
+        try:
+            self.range_queries += 1
+            logs = self._query({
+                "start_date": self.start_date.isoformat(),
+                "end_date": (datetime.now(timezone.utc).date() + timedelta(days=1)).isoformat(),
+                "summarize": "false",
+            })
+            found = {log['request_id']: log.get('spend') for log in logs if log and log.get('request_id') in pending}
+        except Exception as e:
+            self.logger.warning(f"Spend log range query failed: {e}")
+            found = {}
+        
+        with self._lock:
+            exhausted = []
+            for request_id in pending:
+                if request_id in found:
+                    self.costs[request_id] = found[request_id]
+                    del self._attempts[request_id]
+                    continue
+                self._attempts[request_id] += 1
+                if self._attempts[request_id] >= self.max_attempts:
+                    exhausted.append(request_id)
+                    del self._attempts[request_id]
+        if exhausted:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(exhausted))) as executor:
+                list(executor.map(self._query_one, exhausted))
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            # Let more ids arrive, and their spend logs be written, before querying
+            with self._lock:
+                delay = self._delay
+                self._delay = min(self._delay * 2, RECONCILE_MAX_DELAY)
+            if self._stopped.wait(delay):
+                return
+            self._flush()
+            with self._lock:
+                if not self._attempts:
+                    self._wake.clear()
+                    self._idle.set()
+
+    def wait(self, timeout: float | None = None) -> dict[str, float | None]:
+        '''
+        Wait up to `timeout` seconds for all lookups to finish.
+        Returns {request_id: proxy cost, or None if it could not be found}; ids
+        still being looked up when the timeout expires are left out.
+        '''
+        start = time()
+        if not self._idle.wait(timeout):
+            self.logger.warning(f"Cost reconciliation timed out after {timeout:.0f}s with {len(self._attempts)} requests unresolved")
+        self.logger.info(f"Reconciled {sum(1 for cost in self.costs.values() if cost is not None)}/{len(self._seen)} LLM request costs "
+                         f"with {self.range_queries} spend log queries in {time() - start:.2f}s")
+        with self._lock:
+            return dict(self.costs)
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wake.set()
+
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+
+# Compact records kept in memory per client; full payloads go to the transcript
+DEFAULT_HISTORY_SIZE = int(os.getenv('LITELLM_HISTORY_SIZE', 64))
+
+
+def message_hash(message: Any) -> str:
+    '''
+    Short content hash of one chat message, to tell prompts apart without keeping them.
+    '''
+    canonical = json.dumps(message, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+class Transcript:
+    '''
+    Append-only JSONL file with the full request and response of every LLM call.
+
+    Written as calls complete and read back lazily, one entry at a time, by
+    iterating over it (or with `iter_transcript`), so long runs never hold all
+    payloads in memory.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f"Transcript(path={self.path})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def append(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + "\n")
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter_transcript(self.path)
+
+
+def iter_transcript(path: str) -> Iterator[Dict[str, Any]]:
+    '''
+    Lazily yield the entries of a transcript file.
+    '''
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_transcript(directory: Optional[str]) -> Optional[Transcript]:
+    '''
+    A transcript named transcript.jsonl in `directory`, or None without a directory.
+    '''
+    return Transcript(os.path.join(directory, "transcript.jsonl")) if directory else None
@@ -0,0 +1,79 @@
+import json
+import os
+from typing import Dict, Optional
+
+
+# Bump whenever DEFAULT_PRICES changes, so recorded costs can be traced to the prices used
+PRICE_TABLE_VERSION = "2025-10-01"
+
+# USD per 1M tokens. "cached_input" applies to prompt tokens served from the provider's
+# prompt cache; models without it bill cached tokens at the normal input price.
+DEFAULT_PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-5": {"input": 1.25, "cached_input": 0.125, "output": 10.00},
+    "gpt-5-mini": {"input": 0.25, "cached_input": 0.025, "output": 2.00},
+    "gpt-5-nano": {"input": 0.05, "cached_input": 0.005, "output": 0.40},
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gpt-4.1-nano": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
+    "gemini-2.5-pro": {"input": 1.25, "cached_input": 0.31, "output": 10.00},
+    "gemini-2.5-flash": {"input": 0.30, "cached_input": 0.075, "output": 2.50},
+    "gemini-2.5-flash-lite": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+    "claude-sonnet-4": {"input": 3.00, "cached_input": 0.30, "output": 15.00},
+    "claude-opus-4": {"input": 15.00, "cached_input": 1.50, "output": 75.00},
+}
+
+
+class PriceTable:
+    """
+    Per-model token prices used to cost LLM responses locally from their usage.
+
+    Models are matched exactly, then without a provider prefix (``openai/gpt-5``),
+    then by the longest known model name they start with, so dated snapshots such
+    as ``gpt-5-nano-2025-08-07`` use the ``gpt-5-nano`` prices.
+    """
+    def __init__(self, prices: Optional[Dict[str, Dict[str, float]]] = None, version: str = PRICE_TABLE_VERSION):
+        self.prices = DEFAULT_PRICES if prices is None else prices
+        self.version = version
+
+    def __str__(self) -> str:
+        return f"PriceTable(version={self.version}, models={len(self.prices)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @classmethod
+    def from_file(cls, path: str) -> 'PriceTable':
+        """Load a table from JSON: ``{"version": "...", "prices": {"<model>": {"input": ..., "output": ...}}}``."""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(prices=data['prices'], version=data.get('version', os.path.basename(path)))
+
+    def lookup(self, model: str) -> Optional[Dict[str, float]]:
+        if model in self.prices:
+            return self.prices[model]
+        name = model.split('/')[-1]
+        if name in self.prices:
+            return self.prices[name]
+        matches = [known for known in self.prices if name.startswith(known)]
+        return self.prices[max(matches, key=len)] if matches else None
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+        """Cost in USD of one request, or None if the model is not in the table."""
+        price = self.lookup(model)
+        if price is None:
+            return None
+        cached_tokens = min(cached_tokens, prompt_tokens)
+        return (
+            (prompt_tokens - cached_tokens) * price['input']
+            + cached_tokens * price.get('cached_input', price['input'])
+            + completion_tokens * price['output']
+        ) / 1_000_000
+
+
+def load_price_table() -> PriceTable:
+    """The table named by the LITELLM_PRICE_TABLE environment variable, or the built-in one."""
+    path = os.getenv('LITELLM_PRICE_TABLE')
+    return PriceTable.from_file(path) if path else PriceTable()
@@ -0,0 +1,209 @@
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import openai
+
+
+DEFAULT_MAX_RETRIES = int(os.getenv('LITELLM_MAX_RETRIES', 4))
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 30.0
+# Never wait longer than this for a single Retry-After
+MAX_RETRY_AFTER = 120.0
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+
+def estimate_tokens(messages: Any, kwargs: dict) -> int:
+    '''
+    Rough token count of a request before it is sent: about 4 characters per token
+    of the messages plus the completion budget, if one is set.
+    '''
+    prompt = len(json.dumps(messages, default=str)) // 4
+    return prompt + int(kwargs.get('max_completion_tokens') or kwargs.get('max_tokens') or 0)
+
+
+class TokenBucket:
+    """
+    A per-minute budget refilled continuously. ``reserve`` takes from the bucket
+    immediately, possibly going into debt, and returns how long the caller has to
+    wait until that debt is repaid, so concurrent callers queue up in order.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def __str__(self) -> str:
+        return f"TokenBucket(capacity={self.capacity}, level={self.level:.1f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        self._refill()
+        # A request larger than the whole bucket only waits for a full bucket
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets per model.
+
+    ``limits`` maps a model name to ``{"rpm": ..., "tpm": ...}`` (either may be
+    omitted); ``"*"`` applies to models without their own entry, each with its own
+    buckets. Models without limits are not throttled.
+    """
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self.limits = limits or {}
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f"RateLimiter(limits={self.limits})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def _model_buckets(self, model: str) -> Dict[str, TokenBucket]:
+        if model not in self._buckets:
+            limits = self.limits.get(model, self.limits.get('*', {}))
+            self._buckets[model] = {kind: TokenBucket(limits[kind]) for kind in ('rpm', 'tpm') if limits.get(kind)}
+        return self._buckets[model]
+
+    def reserve(self, model: str, tokens: int) -> float:
+        '''
+        Take one request and `tokens` tokens from the model's budget; returns the
+        seconds to wait before sending.
+        '''
+        with self._lock:
+            buckets = self._model_buckets(model)
+            waits = [0.0]
+            if 'rpm' in buckets:
+                waits.append(buckets['rpm'].reserve(1))
+            if 'tpm' in buckets:
+                waits.append(buckets['tpm'].reserve(tokens))
+            return max(waits)
+
+    def acquire(self, model: str, tokens: int) -> float:
+        '''
+        Wait until the request may be sent; returns the time waited.
+        '''
+        wait = self.reserve(model, tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def settle(self, model: str, estimated_tokens: int, actual_tokens: int):
+        '''
+        Correct a reservation once the request's real token count is known.
+        '''
+        with self._lock:
+            bucket = self._model_buckets(model).get('tpm')
+            if bucket is None:
+                return
+            if actual_tokens < estimated_tokens:
+                bucket.refund(estimated_tokens - actual_tokens)
+            else:
+                bucket.reserve(actual_tokens - estimated_tokens)
+
+
+class RetryPolicy:
+    """
+    Retries for rate limits (429), timeouts, conflicts and transient 5xx errors or
+    connection failures. The delay is the server's ``Retry-After`` when it sends
+    one, else full-jitter exponential backoff.
+    """
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, base_delay: float = DEFAULT_RETRY_BASE_DELAY,
+                 max_delay: float = DEFAULT_RETRY_MAX_DELAY):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def __str__(self) -> str:
+        return f"RetryPolicy(max_retries={self.max_retries}, base_delay={self.base_delay}, max_delay={self.max_delay})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @staticmethod
+    def retryable(error: Exception) -> bool:
+        if isinstance(error, openai.APIConnectionError):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+        return False
+
+    @staticmethod
+    def retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, 'response', None)
+        if response is None:
+            return None
+        headers = response.headers
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            if headers.get('retry-after'):
+                value = headers['retry-after']
+                try:
+                    return float(value)
+                except ValueError:
+                    return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+        return None
+
+    def delay(self, error: Exception, attempt: int) -> Optional[float]:
+        '''
+        Seconds to wait before retry number `attempt + 1`, or None if the error
+        should be raised.
+        '''
+        if attempt >= self.max_retries or not self.retryable(error):
+            return None
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, MAX_RETRY_AFTER)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def split_limits(limits: Dict[str, Dict[str, float]], shares: int) -> Dict[str, Dict[str, float]]:
+    '''
+    Each of `shares` concurrent agents' part of `limits`, so that together they
+    stay within the configured budget.
+    '''
+    return {model: {kind: value / shares for kind, value in model_limits.items()} for model, model_limits in limits.items()}
+
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_shared_rate_limiter() -> RateLimiter:
+    '''
+    The process-wide limiter, configured from the LITELLM_RATE_LIMITS environment
+    variable (JSON, e.g. {"gpt-5-nano": {"rpm": 500, "tpm": 200000}}). Those are the
+    limits of the whole evaluation: with LITELLM_RATE_LIMIT_SHARES set to the
+    number of agents running at once (eval_agent.py sets it to --jobs), each
+    process gets an equal share of them.
+    '''
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            limits = json.loads(os.getenv('LITELLM_RATE_LIMITS') or '{}')
+            shares = int(os.getenv('LITELLM_RATE_LIMIT_SHARES') or 1)
+            _shared_limiter = RateLimiter(split_limits(limits, shares) if shares > 1 else limits)
+        return _shared_limiter
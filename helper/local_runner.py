@@ -0,0 +1,155 @@
+import os
+import json
+import logging
+import multiprocessing
+import shutil
+import signal
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+
+class AgentTimeout(BaseException):
+    """
+    Raised inside a local worker when the agent runs past its timeout.
+
+    Derives from BaseException so that the agent's own ``except Exception``
+    handlers do not swallow it.
+    """
+
+
+def _init_worker():
+    # Import the agent once per worker process so each challenge starts warm
+    import agent.agent  # noqa: F401
+
+
+# Set by the alarm handler, since libraries may wrap AgentTimeout in their own errors
+_timeout_fired = threading.Event()
+
+
+def _raise_timeout(signum, frame):
+    _timeout_fired.set()
+    raise AgentTimeout()
+
+
+def _run_local_challenge(challenge_data: Dict[str, Any], output_dir: str, timeout: Optional[float]) -> Dict[str, Any]:
+    '''
+    Solve one challenge in this worker process, the way run_agent.py does inside a
+    container, and return a result shaped like DockerManager.run_agent's.
+    '''
+    from agent.agent import Agent
+    from helper.ctf_challenge import CTFChallenge, CTFChallengeGrader
+    from helper.llm_cassette import load_cassette
+    from helper.llm_helper import LiteLLMManager
+    from helper.llm_history import load_transcript
+
+    logger = logging.getLogger("local_agent")
+    logger.setLevel(logging.INFO)
+    log_handler = logging.FileHandler(os.path.join(output_dir, 'agent.log'))
+    log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(log_handler)
+
+    challenge = CTFChallenge(
+        name=challenge_data['name'],
+        description=challenge_data['description'],
+        categories=challenge_data['categories'],
+        artifacts_folder=challenge_data['artifacts_folder'],
+        flag=challenge_data['flag'],
+        flag_regex=challenge_data['flag_regex']
+    )
+    llm_manager = None
+    working_root = tempfile.mkdtemp(prefix="ctf-local-")
+    found_flag = None
+    error = None
+    _timeout_fired.clear()
+    if timeout:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        # Inside the try so that a missing or corrupt cassette is reported as the run's error
+        llm_manager = LiteLLMManager(cassette=load_cassette(output_dir), transcript=load_transcript(output_dir))
+        client = CTFChallengeGrader(challenge).create_client(os.path.join(working_root, 'workdir'))
+        found_flag = Agent(llm_manager, logger=logger).solve_challenge(client)
+        logger.info(f"Agent completed. Found flag: {found_flag}")
+    except AgentTimeout:
+        pass
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Agent failed: {e}", exc_info=True)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        shutil.rmtree(working_root, ignore_errors=True)
+    timed_out = _timeout_fired.is_set()
+    if timed_out:
+        logger.error(f"Agent timed out after {timeout}s")
+
+    total_cost = llm_manager.get_usage_report()['total_cost'] if llm_manager else 0.0
+    logger.info(f"Total LLM cost (local estimate): ${total_cost:.6f}")
+
+    result = {
+        'found_flag': found_flag,
+        'success': found_flag == challenge.flag if found_flag else False,
+        'llm_request_ids': llm_manager.llm_requests if llm_manager else [],
+        'llm_cost': total_cost
+    }
+    if error:
+        result['error'] = error
+    with open(os.path.join(output_dir, 'final_result.txt'), 'w') as f:
+        f.write(json.dumps(result))
+
+    logger.removeHandler(log_handler)
+    log_handler.close()
+    return {
+        'result': result,
+        'timed_out': timed_out,
+        'exit_code': None,
+        'agent_worker': f"local-{os.getpid()}",
+        'log_bytes': os.path.getsize(os.path.join(output_dir, 'agent.log')),
+    }
+
+
+class LocalAgentPool:
+    """
+    Worker processes that run challenges without services directly through
+    ``CTFChallengeGrader.create_client``, with no Docker network, image or container.
+
+    Each worker imports the agent once and then solves challenges one at a time.
+    Timeouts are enforced inside the worker with SIGALRM.
+    """
+    def __init__(self, workers: int = 1, logger: Optional[logging.Logger] = None):
+        self.workers = max(workers, 1)
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn rather than fork: the evaluator runs Docker supervisor and pool threads
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker)
+
+    def __str__(self) -> str:
+        return f"LocalAgentPool(workers={self.workers})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def run_challenge(self, challenge_data: Dict[str, Any], output_dir: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Run one challenge on a worker process and wait for its result."""
+        with self._lock:
+            executor = self._executor
+        try:
+            return executor.submit(_run_local_challenge, challenge_data, output_dir, timeout).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. the agent crashed the interpreter); replace the pool for later runs
+            with self._lock:
+                if self._executor is executor:
+                    self.logger.error(f"{self} lost a worker process, starting a new pool")
+                    self._executor = self._new_executor()
+            raise
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,188 @@
+import re
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optional, token counts fall back to a per-model estimate
+    tiktoken = None
+
+
+# Characters per token by model family, used when tiktoken is not installed
+CHARS_PER_TOKEN = {
+    "gpt": 4.0,
+    "o1": 4.0,
+    "o3": 4.0,
+    "gemini": 4.0,
+    "claude": 3.5,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+DEFAULT_MESSAGE_BUDGET = 6000
+# Lines around each flag-regex match that are kept with it
+MATCH_CONTEXT_LINES = 2
+MAX_LINE_CHARS = 400
+# Bytes per line of the escaped dump of binary files; at most 4 characters per byte
+BINARY_LINE_BYTES = 64
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    '''
+    Number of tokens `text` takes for `model`: exact with tiktoken for OpenAI
+    models when it is installed, otherwise estimated from the character count.
+    '''
+    name = model.split('/')[-1]
+    if tiktoken is not None and name.startswith(("gpt", "o1", "o3")):
+        try:
+            encoding = tiktoken.encoding_for_model(name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text, disallowed_special=()))
+    chars_per_token = next((ratio for prefix, ratio in CHARS_PER_TOKEN.items() if name.startswith(prefix)),
+                           DEFAULT_CHARS_PER_TOKEN)
+    return int(len(text) / chars_per_token) + 1
+
+
+def bytes_to_text(data: bytes) -> str:
+    '''
+    Readable text of file content: decoded as UTF-8 when it is text, otherwise an
+    escaped dump with one line of BINARY_LINE_BYTES bytes per offset (like
+    `repr(bytes)`, every byte kept), where runs of identical lines are collapsed.
+    '''
+    text = data.decode('utf-8', errors='replace')
+    if not data or text.count('\ufffd') + sum(1 for c in text if c < ' ' and c not in '\n\r\t') < len(text) * 0.1:
+        return text
+    lines = []
+    previous, run_start = None, None
+    for offset in range(0, len(data), BINARY_LINE_BYTES):
+        chunk = data[offset:offset + BINARY_LINE_BYTES]
+        if chunk == previous:
+            run_start = offset if run_start is None else run_start
+            continue
+        if run_start is not None:
+            lines.append(f"{run_start:08x}: * same as the line above up to {offset:08x}")
+            run_start = None
+        previous = chunk
+        lines.append(f"{offset:08x}: {repr(chunk)[2:-1]}")
+    if run_start is not None:
+        lines.append(f"{run_start:08x}: * same as the line above up to {len(data):08x}")
+    return "\n".join(lines)
+
+
+class PromptBuilder:
+    """
+    Fits artifact contents and tool output into a per-message token budget.
+
+    Content that is over budget is first de-duplicated (runs of identical
+    adjacent lines are collapsed in place), then reduced to the most relevant slices: lines matching the flag
+    regex (with a little context), and head and tail windows. Every elision is
+    marked in the text and recorded in ``report``.
+    """
+    def __init__(self, model: str, budget: int = DEFAULT_MESSAGE_BUDGET, flag_regex: Optional[str] = None):
+        self.model = model
+        self.budget = budget
+        self.flag_pattern = re.compile(flag_regex) if flag_regex else None
+        self.report: List[Dict[str, int | str]] = []
+
+    def __str__(self) -> str:
+        return f"PromptBuilder(model={self.model}, budget={self.budget}, elided_tokens={self.elided_tokens})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def elided_tokens(self) -> int:
+        return sum(entry['elided_tokens'] for entry in self.report)
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def _dedupe(self, lines: List[str]) -> Tuple[List[str], List[int]]:
+        '''
+        Collapse runs of identical adjacent lines; returns the lines and how many
+        original lines each one stands for.
+        '''
+        deduped, spans = [], []
+        for line, run in groupby(lines):
+            repeats = sum(1 for _ in run)
+            if len(line) > MAX_LINE_CHARS:
+                line = line[:MAX_LINE_CHARS] + f" [... {len(line) - MAX_LINE_CHARS} chars]"
+            if repeats > 1:
+                line = f"{line}  [repeated {repeats} times]"
+            deduped.append(line)
+            spans.append(repeats)
+        return deduped, spans
+
+    def _take(self, lines: List[str], indexes, budget: int) -> List[int]:
+        taken, used = [], 0
+        for index in indexes:
+            cost = self.count(lines[index]) + 1
+            if used + cost > budget:
+                break
+            taken.append(index)
+            used += cost
+        return taken
+
+    def fit(self, text: str, label: str = "content", budget: Optional[int] = None) -> str:
+        '''
+        Return `text`, or the most relevant slices of it, within `budget` tokens.
+        '''
+        budget = budget or self.budget
+        original_tokens = self.count(text)
+        if original_tokens <= budget:
+            self.report.append({"label": label, "original_tokens": original_tokens, "kept_tokens": original_tokens, "elided_tokens": 0})
+            return text
+
+        lines, spans = self._dedupe(text.splitlines())
+        fitted = "\n".join(lines)
+        if self.count(fitted) > budget:
+            # Reserve room for the elision markers, then matches, head and tail
+            available = max(budget - 20, 0)
+            keep = set()
+            if self.flag_pattern:
+                matches = [i for i, line in enumerate(lines) if self.flag_pattern.search(line)]
+                around = [j for i in matches for j in range(max(i - MATCH_CONTEXT_LINES, 0), min(i + MATCH_CONTEXT_LINES + 1, len(lines)))]
+                keep.update(self._take(lines, list(dict.fromkeys(around)), available // 3))
+            remaining = available - sum(self.count(lines[i]) + 1 for i in keep)
+            keep.update(self._take(lines, [i for i in range(len(lines)) if i not in keep], remaining * 3 // 5))
+            remaining = available - sum(self.count(lines[i]) + 1 for i in keep)
+            keep.update(self._take(lines, [i for i in reversed(range(len(lines))) if i not in keep], remaining))
+
+            kept_lines, skipped = [], 0
+            for i, line in enumerate(lines):
+                if i in keep:
+                    if skipped:
+                        kept_lines.append(f"[... {skipped} lines elided ...]")
+                        skipped = 0
+                    kept_lines.append(line)
+                else:
+                    skipped += spans[i]
+            if skipped:
+                kept_lines.append(f"[... {skipped} lines elided ...]")
+            fitted = "\n".join(kept_lines)
+
+        kept_tokens = self.count(fitted)
+        self.report.append({"label": label, "original_tokens": original_tokens, "kept_tokens": kept_tokens,
+                            "elided_tokens": max(original_tokens - kept_tokens, 0)})
+        return fitted
+
+    def fit_bytes(self, data: bytes, label: str = "file", budget: Optional[int] = None) -> str:
+        return self.fit(bytes_to_text(data), label, budget)
+
+    def fit_outputs(self, outputs: List[str], label: str = "outputs", budget: Optional[int] = None) -> str:
+        '''
+        Join tool outputs within one budget, dropping outputs identical to an earlier
+        one and giving each remaining output an equal share.
+        '''
+        budget = budget or self.budget
+        unique = list(dict.fromkeys(outputs))
+        if not unique:
+            return ""
+        share = max(budget // len(unique), 1)
+        return "\n".join(self.fit(output, f"{label}[{i}]", share) for i, output in enumerate(unique))
+
+    def summary(self) -> str:
+        '''
+        One-line account of what was elided, for logs.
+        '''
+        original = sum(entry['original_tokens'] for entry in self.report)
+        return f"{self.elided_tokens} of {original} tokens elided across {len(self.report)} sections"
@@ -0,0 +1,137 @@
+import logging
+import os
+import socket
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+
+DEFAULT_READINESS_TIMEOUT = 60.0
+INITIAL_POLL_INTERVAL = 0.1
+MAX_POLL_INTERVAL = 2.0
+
+
+class ServiceNotReadyError(Exception):
+    """Raised when a service does not become ready before its deadline."""
+
+
+class ReadinessProbe:
+    """
+    Polls a challenge service container until it accepts work.
+
+    The probe is configured by the optional ``healthcheck`` block of a service in
+    ``challenge.json``:
+
+    - ``{"type": "tcp"}``: connect to ``internal_port``, through its published host
+      port when there is one
+    - ``{"type": "http", "path": "/", "status": 200}``: GET ``internal_port`` and expect the status
+    - ``{"type": "command", "command": ["cat", "/app/database.db"]}``: exec inside the container, expect exit code 0
+
+    Every type accepts ``timeout`` (seconds until the service is declared failed).
+    Without a ``healthcheck`` block a TCP probe on ``internal_port`` is used, and a
+    service without ``internal_port`` is ready as soon as its container is running.
+    """
+
+    def __init__(self, container: Any, network: str, service: Dict[str, Any]):
+        self.container = container
+        self.network = network
+        self.service = service
+        self.port = service.get('internal_port')
+        self.healthcheck = service.get('healthcheck') or ({'type': 'tcp'} if self.port else {'type': 'running'})
+        self.timeout = float(self.healthcheck.get('timeout', DEFAULT_READINESS_TIMEOUT))
+
+    def _probe_address(self, port: int) -> Tuple[str, int]:
+        """
+        Where the host can reach the service's ``port``: its published host port
+        when it has one, which also works on Docker Desktop (macOS/Windows) where
+        container IPs are not routable from the host, otherwise the container's
+        IP on the challenge network.
+        """
+        self.container.reload()
+        settings = self.container.attrs['NetworkSettings']
+        for binding in (settings.get('Ports') or {}).get(f"{port}/tcp") or []:
+            if binding.get('HostPort'):
+                host = binding.get('HostIp') or ''
+                if host in ('', '0.0.0.0', '::'):
+                    # A remote daemon publishes ports on its own host
+                    docker_host = urllib.parse.urlparse(os.environ.get('DOCKER_HOST', ''))
+                    host = docker_host.hostname if docker_host.scheme == 'tcp' and docker_host.hostname else '127.0.0.1'
+                return host, int(binding['HostPort'])
+        return settings['Networks'][self.network]['IPAddress'], port
+
+    def _check(self) -> bool:
+        self.container.reload()
+        if self.container.status in ('exited', 'dead'):
+            raise ServiceNotReadyError(f"Service {self.service['name']} exited while starting")
+        if self.container.status != 'running':
+            return False
+
+        probe_type = self.healthcheck.get('type', 'tcp')
+        if probe_type == 'running':
+            return True
+        if probe_type == 'command':
+            exit_code, _ = self.container.exec_run(self.healthcheck['command'])
+            return exit_code == 0
+
+        port = self.healthcheck.get('port', self.port)
+        if port is None:
+            raise ValueError(f"Service {self.service['name']} has a {probe_type} healthcheck but no internal_port")
+        address, port = self._probe_address(int(port))
+        if probe_type == 'tcp':
+            try:
+                with socket.create_connection((address, port), timeout=1):
+                    return True
+            except OSError:
+                return False
+        if probe_type == 'http':
+            url = f"http://{address}:{port}{self.healthcheck.get('path', '/')}"
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except (OSError, ValueError):
+                return False
+            return status == int(self.healthcheck.get('status', 200))
+        raise ValueError(f"Unknown healthcheck type '{probe_type}' for service {self.service['name']}")
+
+    def wait(self) -> float:
+        """Poll with exponential backoff until ready; return the time it took in seconds."""
+        start = time.time()
+        deadline = start + self.timeout
+        interval = INITIAL_POLL_INTERVAL
+        while True:
+            if self._check():
+                return time.time() - start
+            if time.time() + interval > deadline:
+                raise ServiceNotReadyError(
+                    f"Service {self.service['name']} not ready after {self.timeout:.0f}s "
+                    f"({self.healthcheck.get('type', 'tcp')} probe)"
+                )
+            time.sleep(interval)
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+
+def wait_for_services(started: List[Dict[str, Any]], network: str, logger: Optional[logging.Logger] = None) -> Dict[str, float]:
+    """
+    Probe all started services of a challenge concurrently.
+
+    ``started`` holds ``{'service': <challenge.json entry>, 'container': <container>}``
+    items. Returns the time-to-ready of each service by name, or raises
+    ServiceNotReadyError for the first service that failed.
+    """
+    logger = logger or logging.getLogger(__name__)
+    if not started:
+        return {}
+
+    probes = [ReadinessProbe(item['container'], network, item['service']) for item in started]
+    with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+        futures = [executor.submit(probe.wait) for probe in probes]
+        ready_times = {}
+        for probe, future in zip(probes, futures):
+            ready_times[probe.service['name']] = future.result()
+            logger.info(f"Service {probe.service['name']} is ready after {ready_times[probe.service['name']]:.2f}s")
+    return ready_times
@@ -0,0 +1,194 @@
+import os
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from helper.ctf_challenge import create_challenge_from_chaldir
+from helper.docker_manager import DEFAULT_STOP_TIMEOUT, AgentWorker, DockerManager
+from helper.readiness import wait_for_services
+
+
+RESET_MODES = ('restart', 'snapshot')
+
+
+class ServiceStack:
+    """
+    A running set of challenge services on their own network, ready to be handed
+    to an agent run.
+    """
+    def __init__(self, chal_dir: str, docker_manager: DockerManager, network_name: str, network_id: str):
+        self.chal_dir = chal_dir
+        self.docker_manager = docker_manager
+        self.network_name = network_name
+        self.network_id = network_id
+        self.started: List[Dict[str, Any]] = []
+        self.snapshots: Dict[str, Any] = {}
+        self.ready_time: Dict[str, float] = {}
+        self.agent_worker: Optional[AgentWorker] = None
+        self.uses = 0
+
+    def __str__(self) -> str:
+        return f"ServiceStack(chal_dir={self.chal_dir}, network_name={self.network_name}, services={len(self.started)}, uses={self.uses})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ServicePool:
+    """
+    Warm pool of pre-started challenge service stacks.
+
+    Keeps up to ``size`` stacks per challenge. A stack is handed out by ``acquire``
+    and, on ``release``, reset in the background so it is ready for the next run:
+    - ``restart``: restart every service container in place
+    - ``snapshot``: replace every container with a fresh one from an image
+      committed right after the stack first became ready, discarding any changes
+      an agent made to the service's filesystem
+    """
+    def __init__(self, size: int = 1, reset_mode: str = 'restart', rebuild: bool = False,
+                 run_id: Optional[str] = None, stop_timeout: int = DEFAULT_STOP_TIMEOUT,
+                 logger: Optional[logging.Logger] = None):
+        if reset_mode not in RESET_MODES:
+            raise ValueError(f"Unknown reset mode '{reset_mode}', expected one of {RESET_MODES}")
+        self.size = size
+        self.reset_mode = reset_mode
+        self.rebuild = rebuild
+        self.run_id = run_id
+        self.stop_timeout = stop_timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(thread_name_prefix="service-pool")
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[Future]] = {}
+        self._stack_counts: Dict[str, int] = {}
+        self._closed = False
+
+    def _create_stack(self, chal_dir: str) -> ServiceStack:
+        challenge = create_challenge_from_chaldir(chal_dir)
+        challenge_name = os.path.basename(chal_dir)
+        docker_manager = DockerManager(logging.getLogger(f"pool_{challenge_name}"), run_id=self.run_id,
+                                       challenge_name=challenge_name, stop_timeout=self.stop_timeout)
+        network_name = docker_manager.unique_name(f"ctf-network-{challenge_name.lower().replace('_', '-')}")
+        try:
+            stack = ServiceStack(chal_dir, docker_manager, network_name, docker_manager.create_network(network_name))
+            stack.started = docker_manager.deploy_services(
+                chal_dir, challenge.services, network_name,
+                fixed_host_ports=False, rebuild=self.rebuild
+            )
+            stack.ready_time = wait_for_services(stack.started, network_name, docker_manager.logger)
+            if self.reset_mode == 'snapshot':
+                for item in stack.started:
+                    # Labelled like the stack's containers so that gc can remove it after a crash
+                    stack.snapshots[item['service']['name']] = item['container'].commit(
+                        repository="ctf-snapshot",
+                        tag=docker_manager.unique_name(item['service']['name']),
+                        conf={'Labels': docker_manager.labels}
+                    )
+            self.logger.info(f"Warmed up {stack}")
+            return stack
+        except Exception:
+            docker_manager.cleanup()
+            raise
+
+    def _reset_stack(self, stack: ServiceStack) -> ServiceStack:
+        try:
+            docker_manager = stack.docker_manager
+            for item in stack.started:
+                container = item['container']
+                if self.reset_mode == 'restart':
+                    container.restart(timeout=1)
+                    continue
+
+                # Recreate the container from the snapshot under the same name and alias
+                service = item['service']
+                docker_manager.containers.remove(container)
+                container.remove(force=True)
+                item['container'] = docker_manager.start_container(
+                    image=stack.snapshots[service['name']].id,
+                    name=container.name,
+                    network=stack.network_name,
+                    environment=service.get('environment', {}),
+                    ports={container_port: None for container_port in service.get('ports', {})},
+                    alias=service['name']
+                )
+            stack.ready_time = wait_for_services(stack.started, stack.network_name, docker_manager.logger)
+            self.logger.info(f"Reset {stack} ({self.reset_mode})")
+            return stack
+        except Exception:
+            self._teardown(stack)
+            raise
+
+    def _teardown(self, stack: ServiceStack):
+        if stack.agent_worker:
+            stack.agent_worker.close()
+        stack.docker_manager.cleanup()
+        for image in stack.snapshots.values():
+            try:
+                stack.docker_manager.client.images.remove(image.id, force=True)
+            except Exception as e:
+                self.logger.error(f"Failed to remove snapshot image {image.id}: {e}")
+        stack.snapshots.clear()
+
+    def prewarm(self, chal_dirs: List[str]):
+        """Start warming ``size`` stacks for every given challenge that has services."""
+        for chal_dir in chal_dirs:
+            try:
+                if not create_challenge_from_chaldir(chal_dir).services:
+                    continue
+            except Exception as e:
+                self.logger.error(f"Not prewarming {chal_dir}: {e}")
+                continue
+            with self._lock:
+                idle = self._idle.setdefault(chal_dir, [])
+                while self._stack_counts.get(chal_dir, 0) < self.size:
+                    idle.append(self._executor.submit(self._create_stack, chal_dir))
+                    self._stack_counts[chal_dir] = self._stack_counts.get(chal_dir, 0) + 1
+
+    def acquire(self, chal_dir: str) -> ServiceStack:
+        """Take a ready stack for the challenge, waiting for one being warmed or reset if needed."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Service pool is shut down")
+            idle = self._idle.setdefault(chal_dir, [])
+            if idle:
+                future = idle.pop(0)
+            else:
+                future = self._executor.submit(self._create_stack, chal_dir)
+                self._stack_counts[chal_dir] = self._stack_counts.get(chal_dir, 0) + 1
+
+        try:
+            stack = future.result()
+        except Exception:
+            with self._lock:
+                self._stack_counts[chal_dir] -= 1
+            raise
+        stack.uses += 1
+        return stack
+
+    def release(self, stack: ServiceStack):
+        """Return a stack after use; it is reset in the background, or torn down if the pool is full."""
+        with self._lock:
+            closed = self._closed
+            if not closed and self._stack_counts[stack.chal_dir] <= self.size:
+                self._idle[stack.chal_dir].append(self._executor.submit(self._reset_stack, stack))
+                return
+            self._stack_counts[stack.chal_dir] -= 1
+        
+        if closed:
+            self._teardown(stack)
+        else:
+            self._executor.submit(self._teardown, stack)
+
+    def shutdown(self):
+        """Tear down every idle stack and stop the pool."""
+        with self._lock:
+            self._closed = True
+            pending = [future for idle in self._idle.values() for future in idle]
+            self._idle.clear()
+
+        for future in pending:
+            try:
+                self._teardown(future.result())
+            except Exception as e:
+                self.logger.error(f"Failed to tear down pooled stack: {e}")
+        self._executor.shutdown(wait=True)
@@ -44,13 +44,16 @@ class AgentTests(unittest.TestCase):
             message_cost = self.llm_manager.get_request_cost(response.id)
             self.assertIsInstance(message_cost, (float, int))
 
+            local_cost = self.llm_manager.get_local_cost(response.id)
+            self.assertIsInstance(local_cost, (float, int))
+
         except Exception as e:
             self.fail(f"LiteLLM simple_call failed with model '{test_model}': {e}")
 
     @classmethod
     def tearDownClass(cls):
         """Clean up after all tests in this class have run."""
-        # computing usage cost takes time
+        # computed locally from response usage, no proxy round trips
         usage_cost = cls.llm_manager.get_usage_cost()
         logging.info(f"Total LLM Requests: {len(cls.llm_manager.llm_requests)}")
         logging.info(f"Total Usage Cost: ${usage_cost:.6f}")
@@ -0,0 +1,861 @@
+"""
+Offline unit tests for the helpers that need neither the LiteLLM proxy nor a
+Docker daemon. Run with: python -m unittest tests_offline
+"""
+import asyncio
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import httpx
+import openai
+from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+
+# helper.docker_manager refuses to import without these; no request is ever sent
+os.environ.setdefault('LITELLM_BASE_URL', 'http://localhost:4000')
+os.environ.setdefault('LITELLM_API_KEY', 'sk-offline-tests')
+
+from helper.docker_manager import ContainerStatsPoller, ContainerStatsSampler, LogStreamWriter, fingerprint_paths
+from helper.llm_cache import LLMResponseCache
+from helper.llm_cassette import Cassette, CassetteMismatchError, load_cassette
+from helper.llm_helper import CostReconciler, LiteLLMManager
+from helper.llm_history import Transcript, iter_transcript, load_transcript, message_hash
+from helper.llm_pricing import PriceTable
+from helper.llm_ratelimit import RateLimiter, RetryPolicy, TokenBucket, split_limits
+from helper.prompt_builder import PromptBuilder, bytes_to_text, count_tokens
+
+
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="ctf-tests-")
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def write(self, relative_path: str, content: bytes = b"") -> str:
+        path = os.path.join(self.tmp, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+
+class FingerprintPathsTests(TempDirTestCase):
+
+    def fingerprint(self) -> str:
+        return fingerprint_paths([os.path.join(self.tmp, 'src')], root=self.tmp)
+
+    def test_stable_for_unchanged_sources(self):
+        self.write('src/a.py', b"print('a')")
+        self.write('src/pkg/b.py', b"print('b')")
+        self.assertEqual(self.fingerprint(), self.fingerprint())
+
+    def test_changes_with_content_and_names(self):
+        self.write('src/a.py', b"print('a')")
+        original = self.fingerprint()
+        self.write('src/a.py', b"print('A')")
+        changed_content = self.fingerprint()
+        self.assertNotEqual(original, changed_content)
+        os.rename(os.path.join(self.tmp, 'src/a.py'), os.path.join(self.tmp, 'src/c.py'))
+        self.assertNotEqual(changed_content, self.fingerprint())
+
+    def test_ignores_bytecode_caches(self):
+        self.write('src/a.py', b"print('a')")
+        original = self.fingerprint()
+        self.write('src/__pycache__/a.cpython-313.pyc', b"\x00bytecode")
+        self.write('src/b.pyc', b"\x00bytecode")
+        self.assertEqual(original, self.fingerprint())
+
+    def test_independent_of_root_location(self):
+        self.write('src/a.py', b"print('a')")
+        original = self.fingerprint()
+        moved = os.path.join(self.tmp, 'elsewhere')
+        os.makedirs(moved)
+        shutil.copytree(os.path.join(self.tmp, 'src'), os.path.join(moved, 'src'))
+        self.assertEqual(original, fingerprint_paths([os.path.join(moved, 'src')], root=moved))
+
+
+class LogStreamWriterTests(TempDirTestCase):
+
+    def read(self, name: str) -> bytes:
+        with open(os.path.join(self.tmp, name), 'rb') as f:
+            return f.read()
+
+    def test_unbounded_keeps_everything(self):
+        writer = LogStreamWriter(os.path.join(self.tmp, 'agent.log'))
+        for _ in range(100):
+            writer.write(b"0123456789")
+        writer.close()
+        self.assertEqual(self.read('agent.log'), b"0123456789" * 100)
+        self.assertEqual(writer.bytes_written, 1000)
+        self.assertFalse(writer.truncated)
+
+    def test_cap_drops_output_past_the_limit(self):
+        writer = LogStreamWriter(os.path.join(self.tmp, 'agent.log'), max_bytes=25)
+        for _ in range(10):
+            writer.write(b"0123456789")
+        writer.close()
+        content = self.read('agent.log')
+        self.assertTrue(content.startswith(b"0123456789012345678901234"))
+        self.assertIn(b"[log truncated", content)
+        self.assertEqual(writer.bytes_written, 25)
+        self.assertTrue(writer.truncated)
+
+    def test_rotation_keeps_backups_in_order(self):
+        writer = LogStreamWriter(os.path.join(self.tmp, 'agent.log'), max_bytes=10, backup_count=2)
+        for chunk in (b"aaaaaaaaaa", b"bbbbbbbbbb", b"cccccccccc", b"dd"):
+            writer.write(chunk)
+        writer.close()
+        self.assertEqual(self.read('agent.log'), b"dd")
+        self.assertEqual(self.read('agent.log.1'), b"cccccccccc")
+        self.assertEqual(self.read('agent.log.2'), b"bbbbbbbbbb")
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'agent.log.3')))
+        self.assertEqual(writer.bytes_written, 32)
+        self.assertFalse(writer.truncated)
+
+    def test_chunks_larger_than_the_file_are_split(self):
+        writer = LogStreamWriter(os.path.join(self.tmp, 'agent.log'), max_bytes=4, backup_count=1)
+        writer.write(b"0123456789")
+        writer.close()
+        self.assertEqual(self.read('agent.log'), b"89")
+        self.assertEqual(self.read('agent.log.1'), b"4567")
+
+    def test_writes_after_close_are_ignored(self):
+        writer = LogStreamWriter(os.path.join(self.tmp, 'agent.log'))
+        writer.write(b"kept")
+        writer.close()
+        writer.write(b"dropped")
+        self.assertEqual(self.read('agent.log'), b"kept")
+
+
+class FakeStatsContainer:
+    """One-shot stats of a container using one more CPU second per poll."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.polls = 0
+
+    def stats(self, stream: bool = True, one_shot: bool = False) -> dict:
+        assert not stream and one_shot
+        self.polls += 1
+        return {
+            "cpu_stats": {"cpu_usage": {"total_usage": self.polls * 10**9}, "system_cpu_usage": self.polls * 4 * 10**9, "online_cpus": 4},
+            "memory_stats": {"usage": self.polls * 1000, "stats": {"inactive_file": 100}},
+            "pids_stats": {"current": 3},
+        }
+
+
+class ContainerStatsSamplerTests(unittest.TestCase):
+
+    def test_one_poller_thread_samples_every_container(self):
+        poller = ContainerStatsPoller(interval=0.01)
+        with mock.patch.object(ContainerStatsPoller, 'get', return_value=poller):
+            threads = threading.active_count()
+            containers = [FakeStatsContainer(f"c{i}") for i in range(3)]
+            samplers = [ContainerStatsSampler(container) for container in containers]
+            self.assertEqual(threading.active_count(), threads)
+            while min(container.polls for container in containers) < 5:
+                threading.Event().wait(0.01)
+            usage = [sampler.stop() for sampler in samplers]
+        for entry in usage:
+            self.assertGreaterEqual(entry["samples"], 5)
+            self.assertAlmostEqual(entry["cpu_percent_peak"], 100.0)
+            self.assertAlmostEqual(entry["cpu_percent_avg"], 100.0)
+            self.assertEqual(entry["memory_bytes_peak"], entry["samples"] * 1000 - 100)
+            self.assertEqual(entry["pids_peak"], 3)
+        threading.Event().wait(0.02)
+        polls = [container.polls for container in containers]
+        threading.Event().wait(0.05)
+        self.assertEqual([container.polls for container in containers], polls)
+
+
+class PriceTableTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.table = PriceTable(prices={
+            "gpt-5": {"input": 1.0, "cached_input": 0.1, "output": 10.0},
+            "gpt-5-nano": {"input": 0.05, "output": 0.4},
+        }, version="test")
+
+    def test_cost_per_million_tokens(self):
+        self.assertAlmostEqual(self.table.cost("gpt-5", 1_000_000, 100_000), 1.0 + 1.0)
+
+    def test_cached_tokens_use_cached_price(self):
+        self.assertAlmostEqual(self.table.cost("gpt-5", 1_000_000, 0, cached_tokens=400_000), 0.6 + 0.04)
+
+    def test_cached_tokens_without_cached_price_bill_as_input(self):
+        self.assertAlmostEqual(self.table.cost("gpt-5-nano", 1_000_000, 0, cached_tokens=500_000), 0.05)
+
+    def test_cached_tokens_capped_at_prompt_tokens(self):
+        self.assertAlmostEqual(self.table.cost("gpt-5", 100, 0, cached_tokens=1000), 100 * 0.1 / 1_000_000)
+
+    def test_lookup_by_prefix_and_longest_match(self):
+        self.assertIs(self.table.lookup("openai/gpt-5"), self.table.prices["gpt-5"])
+        self.assertIs(self.table.lookup("gpt-5-nano-2025-08-07"), self.table.prices["gpt-5-nano"])
+        self.assertIs(self.table.lookup("gpt-5-2025-08-07"), self.table.prices["gpt-5"])
+
+    def test_unknown_model_has_no_cost(self):
+        self.assertIsNone(self.table.cost("mystery-model", 10, 10))
+
+    def test_from_file(self):
+        path = self.write('prices.json', b'{"version": "v2", "prices": {"m": {"input": 2.0, "output": 4.0}}}')
+        table = PriceTable.from_file(path)
+        self.assertEqual(table.version, "v2")
+        self.assertAlmostEqual(table.cost("m", 500_000, 500_000), 3.0)
+
+    def test_default_table_prices_repo_models(self):
+        table = PriceTable()
+        for model in ("gpt-5-nano", "gemini-2.5-pro", "gpt-3.5-turbo"):
+            self.assertIsNotNone(table.lookup(model), model)
+
+
+class FakeSpendLogs:
+    """Spend-log endpoint whose logs show up after a given number of range queries."""
+
+    def __init__(self, visible_after: dict, spend: dict):
+        self.visible_after = visible_after
+        self.spend = spend
+        self.range_queries = 0
+        self.per_id_queries = []
+        self.lock = threading.Lock()
+
+    def __call__(self, params: dict) -> list:
+        with self.lock:
+            if 'request_id' in params:
+                self.per_id_queries.append(params['request_id'])
+                return [{"spend": self.spend[params['request_id']]}] if params['request_id'] in self.spend else []
+            self.range_queries += 1
+            return [{"request_id": request_id, "spend": self.spend[request_id]}
+                    for request_id, after in self.visible_after.items() if self.range_queries > after]
+
+
+class CostReconcilerTests(unittest.TestCase):
+
+    def setUp(self):
+        for name, value in (('RECONCILE_INITIAL_DELAY', 0.05), ('RECONCILE_MAX_DELAY', 0.05)):
+            patcher = mock.patch(f'helper.llm_helper.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def reconciler(self, logs: FakeSpendLogs, max_attempts: int = 5) -> CostReconciler:
+        reconciler = CostReconciler(max_attempts=max_attempts)
+        reconciler._query = logs
+        self.addCleanup(reconciler.shutdown)
+        return reconciler
+
+    def test_ids_are_deduplicated_across_submits(self):
+        logs = FakeSpendLogs({"a": 0, "b": 0}, {"a": 0.1, "b": 0.2})
+        reconciler = self.reconciler(logs)
+        reconciler.submit(["a", "b", "a"])
+        reconciler.submit(["b"])
+        self.assertEqual(reconciler.wait(timeout=10), {"a": 0.1, "b": 0.2})
+        self.assertEqual((logs.range_queries, logs.per_id_queries), (1, []))
+        reconciler.submit(["a"])
+        self.assertEqual(reconciler.wait(timeout=10), {"a": 0.1, "b": 0.2})
+        self.assertEqual(logs.range_queries, 1)
+
+    def test_missing_ids_are_carried_to_the_next_flush(self):
+        logs = FakeSpendLogs({"a": 0, "b": 2}, {"a": 0.1, "b": 0.2})
+        reconciler = self.reconciler(logs)
+        reconciler.submit(["a", "b"])
+        self.assertEqual(reconciler.wait(timeout=10), {"a": 0.1, "b": 0.2})
+        self.assertEqual((logs.range_queries, logs.per_id_queries), (3, []))
+
+    def test_falls_back_to_per_id_queries_after_max_attempts(self):
+        logs = FakeSpendLogs({"a": 0}, {"a": 0.1, "late": 0.3})
+        reconciler = self.reconciler(logs, max_attempts=3)
+        reconciler.submit(["a", "late", "lost"])
+        self.assertEqual(reconciler.wait(timeout=10), {"a": 0.1, "late": 0.3, "lost": None})
+        self.assertEqual(logs.range_queries, 3)
+        self.assertEqual(sorted(logs.per_id_queries), ["late", "lost"])
+
+    def test_failed_range_queries_count_as_attempts(self):
+        reconciler = self.reconciler(mock.Mock(side_effect=httpx.ConnectError("proxy down")), max_attempts=2)
+        reconciler.submit(["a"])
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(reconciler.wait(timeout=10), {"a": None})
+        self.assertEqual(reconciler.range_queries, 2)
+
+    def test_wait_returns_partial_results_on_timeout(self):
+        logs = FakeSpendLogs({"a": 0}, {"a": 0.1})
+        reconciler = self.reconciler(logs, max_attempts=1000)
+        reconciler.submit(["a", "never"])
+        with self.assertLogs(level='WARNING') as captured:
+            self.assertEqual(reconciler.wait(timeout=0.5), {"a": 0.1})
+        self.assertIn("timed out", captured.output[0])
+
+
+def _fill_cache(directory: str, writer: int, entries: int):
+    cache = LLMResponseCache(directory)
+    for i in range(entries):
+        cache.put(f"{writer}-{i}", "gpt-5-nano", f'{{"writer": {writer}, "i": {i}}}')
+    cache.close()
+
+
+class LLMResponseCacheTests(TempDirTestCase):
+
+    def test_key_is_canonical(self):
+        first = LLMResponseCache.key("m", [{"role": "user", "content": "hi"}], {"temperature": 0, "seed": 1})
+        second = LLMResponseCache.key("m", [{"content": "hi", "role": "user"}], {"seed": 1, "temperature": 0})
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, LLMResponseCache.key("m", [{"role": "user", "content": "hi"}], {"temperature": 1, "seed": 1}))
+
+    def test_get_put_and_stats(self):
+        cache = LLMResponseCache(self.tmp)
+        self.addCleanup(cache.close)
+        self.assertIsNone(cache.get("k"))
+        cache.put("k", "m", '{"id": "x"}')
+        self.assertEqual(cache.get("k"), '{"id": "x"}')
+        self.assertEqual(cache.stats(), {"entries": 1, "bytes": len('{"id": "x"}'), "hits": 1, "misses": 1})
+
+    def test_expired_entries_miss(self):
+        cache = LLMResponseCache(self.tmp, max_age=-1)
+        self.addCleanup(cache.close)
+        cache.put("k", "m", "{}")
+        self.assertIsNone(cache.get("k"))
+
+    def test_evicts_least_recently_used_over_size(self):
+        cache = LLMResponseCache(self.tmp, max_bytes=30)
+        self.addCleanup(cache.close)
+        cache.put("a", "m", "a" * 10)
+        cache.put("b", "m", "b" * 10)
+        cache.put("c", "m", "c" * 10)
+        cache.get("a")
+        cache.put("d", "m", "d" * 10)
+        self.assertIsNone(cache.get("b"))
+        for key in ("a", "c", "d"):
+            self.assertIsNotNone(cache.get(key), key)
+
+    def test_shared_between_threads(self):
+        cache = LLMResponseCache(self.tmp)
+        self.addCleanup(cache.close)
+        threads = [threading.Thread(target=lambda t=t: [cache.put(f"{t}-{i}", "m", "{}") for i in range(50)])
+                   for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.stats()["entries"], 400)
+
+    def test_shared_between_processes(self):
+        # Like agent containers bind-mounting one cache directory
+        context = multiprocessing.get_context("spawn")
+        writers = [context.Process(target=_fill_cache, args=(self.tmp, writer, 50)) for writer in range(4)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join(timeout=60)
+            self.assertEqual(writer.exitcode, 0)
+        cache = LLMResponseCache(self.tmp)
+        self.addCleanup(cache.close)
+        self.assertEqual(cache.stats()["entries"], 200)
+        self.assertEqual(cache.get("3-49"), '{"writer": 3, "i": 49}')
+
+    def test_readers_never_see_partial_writes(self):
+        cache = LLMResponseCache(self.tmp)
+        values = [c * 200_000 for c in "ab"]
+        seen = set()
+
+        def write():
+            for i in range(50):
+                cache.put("k", "m", values[i % 2])
+
+        def read():
+            for _ in range(200):
+                seen.add(cache.get("k"))
+
+        threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(seen, {None, *values})
+
+    def test_abandoned_temp_files_are_removed(self):
+        cache = LLMResponseCache(self.tmp, max_bytes=16)
+        stale = self.write('llm-responses/ab/.abandoned.tmp', b"partial")
+        os.utime(stale, (0, 0))
+        fresh = self.write('llm-responses/ab/.in-progress.tmp', b"partial")
+        cache.put("k", "m", "x" * 16)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertEqual(cache.stats()["entries"], 1)
+
+
+def _completion(request_id: str, content: str) -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        "id": request_id, "object": "chat.completion", "created": 0, "model": "gpt-5-nano",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    })
+
+
+class CassetteTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp, 'cassette.jsonl')
+        recorder = Cassette(self.path, 'record')
+        recorder.record("gpt-5-nano", [{"role": "user", "content": "hello"}], {}, _completion("r1", "first"))
+        recorder.record("gpt-5-nano", [{"role": "user", "content": "hello"}], {}, _completion("r2", "second"))
+        recorder.record("gpt-5-nano", [{"role": "user", "content": "what is the flag?"}], {}, _completion("r3", "flag{x}"))
+
+    def test_replays_identical_requests_in_recorded_order(self):
+        cassette = Cassette(self.path, 'replay')
+        hello = [{"role": "user", "content": "hello"}]
+        self.assertEqual(cassette.replay("gpt-5-nano", hello, {}).id, "r1")
+        second = cassette.replay("gpt-5-nano", hello, {})
+        self.assertEqual((second.id, second.choices[0].message.content), ("r2", "second"))
+
+    def test_strict_raises_on_unrecorded_request(self):
+        cassette = Cassette(self.path, 'replay')
+        with self.assertRaises(CassetteMismatchError):
+            cassette.replay("gpt-5-nano", [{"role": "user", "content": "something else"}], {})
+        with self.assertRaises(CassetteMismatchError):
+            cassette.replay("gpt-5-nano", [{"role": "user", "content": "hello"}], {"temperature": 1})
+
+    def test_strict_raises_once_recordings_are_used_up(self):
+        cassette = Cassette(self.path, 'replay')
+        messages = [{"role": "user", "content": "what is the flag?"}]
+        cassette.replay("gpt-5-nano", messages, {})
+        with self.assertRaises(CassetteMismatchError):
+            cassette.replay("gpt-5-nano", messages, {})
+
+    def test_nearest_uses_most_similar_recording(self):
+        cassette = Cassette(self.path, 'replay', mismatch='nearest')
+        response = cassette.replay("gpt-5-nano", [{"role": "user", "content": "what is the flag??"}], {})
+        self.assertEqual(response.id, "r3")
+        with self.assertRaises(CassetteMismatchError):
+            cassette.replay("other-model", [{"role": "user", "content": "hello"}], {})
+
+    def test_passthrough_returns_none(self):
+        cassette = Cassette(self.path, 'replay', mismatch='passthrough')
+        self.assertIsNone(cassette.replay("gpt-5-nano", [{"role": "user", "content": "unrecorded"}], {}))
+
+    def test_rejects_unknown_mode_and_policy(self):
+        with self.assertRaises(ValueError):
+            Cassette(self.path, 'rewind')
+        with self.assertRaises(ValueError):
+            Cassette(self.path, 'replay', mismatch='closest')
+
+    def test_load_cassette_from_environment(self):
+        empty_dir = os.path.join(self.tmp, 'empty')
+        os.makedirs(empty_dir)
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop('LITELLM_CASSETTE_MODE', None)
+            self.assertIsNone(load_cassette(self.tmp))
+        with mock.patch.dict(os.environ, {'LITELLM_CASSETTE_MODE': 'replay', 'LITELLM_CASSETTE_MISMATCH': 'nearest'}):
+            cassette = load_cassette(self.tmp)
+            self.assertEqual((cassette.mode, cassette.mismatch, len(cassette.interactions)), ('replay', 'nearest', 3))
+            with self.assertRaises(FileNotFoundError):
+                load_cassette(empty_dir)
+        with mock.patch.dict(os.environ, {'LITELLM_CASSETTE_MODE': 'replay', 'LITELLM_CASSETTE_MISMATCH': 'passthrough'}):
+            with self.assertLogs(level='WARNING'):
+                self.assertIsNone(load_cassette(empty_dir))
+
+
+def _chunk(request_id: str, content: str | None = None, finish_reason: str | None = None, usage: dict | None = None) -> ChatCompletionChunk:
+    choices = [] if content is None and finish_reason is None else \
+        [{"index": 0, "delta": {"content": content}, "finish_reason": finish_reason}]
+    return ChatCompletionChunk.model_validate({
+        "id": request_id, "object": "chat.completion.chunk", "created": 0, "model": "gpt-5-nano",
+        "choices": choices, "usage": usage,
+    })
+
+
+class FakeStream:
+
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def _manager(**kwargs) -> LiteLLMManager:
+    with mock.patch.dict(os.environ):
+        os.environ.pop('LITELLM_CACHE_DIR', None)
+        return LiteLLMManager(price_table=PriceTable(prices={"gpt-5-nano": {"input": 0.05, "output": 0.4}}, version="test"),
+                              rate_limiter=RateLimiter(), **kwargs)
+
+
+class LLMStreamTests(TempDirTestCase):
+
+    messages = [{"role": "user", "content": "what is the flag?"}]
+
+    def client(self, *streams, **manager_kwargs):
+        manager = _manager(**manager_kwargs)
+        client = manager.create_client()
+        client.instance = mock.Mock()
+        client.instance.chat.completions.create.side_effect = list(streams)
+        return manager, client
+
+    def full_stream(self, request_id: str = "s1") -> FakeStream:
+        return FakeStream([
+            _chunk(request_id, "The flag "),
+            _chunk(request_id, "is flag{streamed}"),
+            _chunk(request_id, finish_reason="stop"),
+            _chunk(request_id, usage={"prompt_tokens": 12, "completion_tokens": 6, "total_tokens": 18}),
+        ])
+
+    def test_yields_deltas_and_tracks_usage(self):
+        manager, client = self.client(self.full_stream())
+        stream = client.stream("gpt-5-nano", self.messages)
+        self.assertEqual(list(stream), ["The flag ", "is flag{streamed}"])
+        self.assertEqual(stream.content, "The flag is flag{streamed}")
+        self.assertIsNotNone(stream.time_to_first_token)
+        self.assertEqual(stream.response.choices[0].finish_reason, "stop")
+        self.assertEqual(manager.llm_requests, ["s1"])
+        self.assertEqual(manager.llm_request_usage["s1"]["prompt_tokens"], 12)
+        self.assertNotIn("usage_estimated", manager.llm_request_usage["s1"])
+        record = client.history[-1]
+        self.assertEqual((record["request_id"], record["completion_tokens"], record["stopped_early"]), ("s1", 6, False))
+        _, kwargs = client.instance.chat.completions.create.call_args
+        self.assertEqual((kwargs["stream"], kwargs["stream_options"]), (True, {"include_usage": True}))
+
+    def test_stop_sequences_are_sent_to_the_api(self):
+        _, client = self.client(self.full_stream())
+        client.stream("gpt-5-nano", self.messages, stop=["\n"], temperature=0).read()
+        _, kwargs = client.instance.chat.completions.create.call_args
+        self.assertEqual((kwargs["stop"], kwargs["temperature"]), (["\n"], 0))
+
+    def test_stops_early_on_a_match_and_estimates_usage(self):
+        fake = FakeStream([
+            _chunk("s2", "The flag is "),
+            _chunk("s2", "flag{early}"),
+            _chunk("s2", " and then a long explanation"),
+            _chunk("s2", finish_reason="stop"),
+            _chunk("s2", usage={"prompt_tokens": 12, "completion_tokens": 30, "total_tokens": 42}),
+        ])
+        manager, client = self.client(fake)
+        stream = client.simple_stream("gpt-5-nano", "what is the flag?", stop_when=re.compile(r"flag\{\S+\}"))
+        self.assertEqual(stream.read(), "The flag is flag{early}")
+        self.assertTrue(stream.stopped_early)
+        self.assertTrue(fake.closed)
+        usage = manager.llm_request_usage["s2"]
+        self.assertTrue(usage["usage_estimated"])
+        self.assertEqual(usage["completion_tokens"], len("The flag is flag{early}") // 4)
+        self.assertTrue(client.history[-1]["stopped_early"])
+
+    def test_predicate_stop(self):
+        _, client = self.client(self.full_stream())
+        stream = client.stream("gpt-5-nano", self.messages, stop_when=lambda content: content.endswith(" "))
+        self.assertEqual(stream.read(), "The flag ")
+        self.assertTrue(stream.stopped_early)
+
+    def test_cassette_response_is_a_single_delta(self):
+        path = os.path.join(self.tmp, 'cassette.jsonl')
+        Cassette(path, 'record').record("gpt-5-nano", self.messages, {}, _completion("r1", "flag{replayed}"))
+        manager, client = self.client(cassette=Cassette(path, 'replay'))
+        stream = client.stream("gpt-5-nano", self.messages)
+        self.assertEqual(list(stream), ["flag{replayed}"])
+        client.instance.chat.completions.create.assert_not_called()
+        self.assertEqual(manager.llm_requests, [])
+        self.assertEqual(manager.llm_request_usage["r1"]["cost"], 0.0)
+        self.assertTrue(client.history[-1]["replayed"])
+
+    def test_completed_streams_are_cached(self):
+        cache = LLMResponseCache(self.tmp)
+        self.addCleanup(cache.close)
+        manager, client = self.client(self.full_stream(), cache=cache)
+        self.assertEqual(client.stream("gpt-5-nano", self.messages).read(), "The flag is flag{streamed}")
+        cached = client.stream("gpt-5-nano", self.messages)
+        self.assertEqual(list(cached), ["The flag is flag{streamed}"])
+        self.assertEqual(client.instance.chat.completions.create.call_count, 1)
+        self.assertEqual((manager.cache_hits, manager.llm_requests), (1, ["s1"]))
+        self.assertTrue(client.history[-1]["cache_hit"])
+
+    def test_streams_stopped_early_are_not_cached(self):
+        cache = LLMResponseCache(self.tmp)
+        self.addCleanup(cache.close)
+        _, client = self.client(self.full_stream("s1"), self.full_stream("s2"), cache=cache)
+        client.stream("gpt-5-nano", self.messages, stop_when=re.compile("flag")).read()
+        self.assertEqual(client.stream("gpt-5-nano", self.messages).read(), "The flag is flag{streamed}")
+        self.assertEqual(client.instance.chat.completions.create.call_count, 2)
+
+
+class CallManyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = _manager()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.cancelled = []
+
+    async def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if prompt == "fail":
+                await asyncio.sleep(0.01)
+                raise ValueError("bad request")
+            # Later prompts finish first, so results come back out of order
+            await asyncio.sleep(10 if prompt == "slow" else 0.05 / (1 + int(prompt)))
+            return _completion(f"id-{prompt}", f"answer {prompt}")
+        except asyncio.CancelledError:
+            self.cancelled.append(prompt)
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def call_many(self, requests: list, **kwargs) -> list:
+        async def run():
+            client = self.manager.create_async_client()
+            with mock.patch.object(client.instance.chat.completions, 'create', self.create):
+                try:
+                    return await client.call_many(requests, model="gpt-5-nano", **kwargs)
+                finally:
+                    await client.close()
+        return asyncio.run(run())
+
+    def test_results_are_in_request_order(self):
+        responses = self.call_many([str(i) for i in range(10)])
+        self.assertEqual([response.id for response in responses], [f"id-{i}" for i in range(10)])
+        self.assertEqual(sorted(self.manager.llm_requests), sorted(f"id-{i}" for i in range(10)))
+
+    def test_concurrency_is_capped(self):
+        self.call_many([str(i) for i in range(10)], max_concurrency=3)
+        self.assertEqual(self.peak_in_flight, 3)
+
+    def test_dict_requests_override_defaults(self):
+        responses = self.call_many(["0", {"model": "gpt-5-nano", "messages": [{"role": "user", "content": "1"}]}])
+        self.assertEqual([response.id for response in responses], ["id-0", "id-1"])
+
+    def test_failure_cancels_the_other_requests(self):
+        started = time.monotonic()
+        with self.assertRaises(ValueError):
+            self.call_many(["slow", "fail", "slow"])
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.cancelled, ["slow", "slow"])
+
+    def test_return_exceptions_keeps_failures_in_place(self):
+        results = self.call_many(["0", "fail", "2"], return_exceptions=True)
+        self.assertEqual(results[0].id, "id-0")
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2].id, "id-2")
+        self.assertEqual(self.cancelled, [])
+
+
+def _status_error(status_code: int, headers: dict | None = None) -> openai.APIStatusError:
+    request = httpx.Request("POST", "http://localhost:4000/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+class RateLimiterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('helper.llm_ratelimit.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_goes_into_debt_and_refills(self):
+        bucket = TokenBucket(60)  # one per second
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertAlmostEqual(bucket.reserve(2), 2.0)
+        self.now += 2
+        self.assertEqual(bucket.reserve(0), 0.0)
+
+    def test_oversized_request_waits_for_a_full_bucket_only(self):
+        bucket = TokenBucket(60)
+        bucket.reserve(60)
+        self.assertAlmostEqual(bucket.reserve(600), 60.0)
+
+    def test_requests_per_minute(self):
+        limiter = RateLimiter({"m": {"rpm": 2}})
+        self.assertEqual(limiter.reserve("m", 0), 0.0)
+        self.assertEqual(limiter.reserve("m", 0), 0.0)
+        self.assertAlmostEqual(limiter.reserve("m", 0), 30.0)
+
+    def test_tokens_per_minute_and_settle(self):
+        limiter = RateLimiter({"m": {"tpm": 600}})
+        self.assertEqual(limiter.reserve("m", 600), 0.0)
+        limiter.settle("m", estimated_tokens=600, actual_tokens=300)
+        self.assertEqual(limiter.reserve("m", 300), 0.0)
+        self.assertGreater(limiter.reserve("m", 1), 0.0)
+
+    def test_default_limits_apply_per_model(self):
+        limiter = RateLimiter({"*": {"rpm": 1}})
+        self.assertEqual(limiter.reserve("a", 0), 0.0)
+        self.assertEqual(limiter.reserve("b", 0), 0.0)
+        self.assertGreater(limiter.reserve("a", 0), 0.0)
+
+    def test_unlimited_models_never_wait(self):
+        limiter = RateLimiter({"m": {"rpm": 1}})
+        for _ in range(100):
+            self.assertEqual(limiter.reserve("other", 10_000), 0.0)
+
+    def test_split_limits_between_agents(self):
+        self.assertEqual(split_limits({"m": {"rpm": 60, "tpm": 1000}}, 4), {"m": {"rpm": 15, "tpm": 250}})
+
+
+class RetryPolicyTests(unittest.TestCase):
+
+    def test_retryable_errors(self):
+        request = httpx.Request("POST", "http://localhost:4000/chat/completions")
+        self.assertTrue(RetryPolicy.retryable(openai.APIConnectionError(request=request)))
+        for status_code in (408, 409, 429, 500, 503):
+            self.assertTrue(RetryPolicy.retryable(_status_error(status_code)), status_code)
+        for status_code in (400, 401, 404):
+            self.assertFalse(RetryPolicy.retryable(_status_error(status_code)), status_code)
+        self.assertFalse(RetryPolicy.retryable(ValueError("not an API error")))
+
+    def test_retry_after_headers(self):
+        self.assertEqual(RetryPolicy.retry_after(_status_error(429, {"retry-after": "3"})), 3.0)
+        self.assertEqual(RetryPolicy.retry_after(_status_error(429, {"retry-after-ms": "1500"})), 1.5)
+        self.assertEqual(RetryPolicy.retry_after(_status_error(429, {"retry-after": "Thu, 01 Jan 1970 00:00:00 GMT"})), 0.0)
+        self.assertIsNone(RetryPolicy.retry_after(_status_error(429)))
+
+    def test_delay_honours_retry_after_and_backs_off(self):
+        policy = RetryPolicy(max_retries=3, base_delay=1.0, max_delay=4.0)
+        self.assertEqual(policy.delay(_status_error(429, {"retry-after": "2"}), 0), 2.0)
+        for attempt in range(3):
+            delay = policy.delay(_status_error(503), attempt)
+            self.assertTrue(0 <= delay <= min(4.0, 2 ** attempt), (attempt, delay))
+
+    def test_gives_up(self):
+        policy = RetryPolicy(max_retries=2)
+        self.assertIsNone(policy.delay(_status_error(429), 2))
+        self.assertIsNone(policy.delay(_status_error(400), 0))
+
+
+class HistoryTests(TempDirTestCase):
+
+    def client(self, **manager_kwargs):
+        manager = _manager(**manager_kwargs)
+        client = manager.create_client()
+        client.instance = mock.Mock()
+        client.instance.chat.completions.create.side_effect = \
+            lambda model, messages, **kwargs: _completion(f"id-{messages[-1]['content']}", "x" * 1000)
+        return manager, client
+
+    def test_history_keeps_the_last_calls_without_payloads(self):
+        manager, client = self.client(history_size=3)
+        for i in range(5):
+            client.simple_call("gpt-5-nano", f"{i}", temperature=0)
+        self.assertEqual([record["request_id"] for record in client.history], ["id-2", "id-3", "id-4"])
+        record = client.history[-1]
+        self.assertEqual(record["message_hashes"], [message_hash({"role": "user", "content": "4"})])
+        self.assertEqual((record["prompt_tokens"], record["completion_tokens"]), (10, 5))
+        self.assertNotIn("request", record)
+        self.assertNotIn("response", record)
+        self.assertEqual(len(manager.llm_requests), 5)
+
+    def test_transcript_round_trip(self):
+        manager, client = self.client(history_size=1, transcript=Transcript(os.path.join(self.tmp, "transcript.jsonl")))
+        for i in range(5):
+            client.simple_call("gpt-5-nano", f"{i}", temperature=0)
+        entries = list(manager.iter_transcript())
+        self.assertEqual([entry["request_id"] for entry in entries], [f"id-{i}" for i in range(5)])
+        self.assertEqual(entries[2]["request"], {"model": "gpt-5-nano", "messages": [{"role": "user", "content": "2"}], "temperature": 0})
+        self.assertEqual(ChatCompletion.model_validate(entries[2]["response"]).choices[0].message.content, "x" * 1000)
+        self.assertEqual(list(iter_transcript(manager.transcript.path)), entries)
+
+    def test_without_transcript(self):
+        manager, client = self.client()
+        client.simple_call("gpt-5-nano", "0")
+        self.assertEqual(list(manager.iter_transcript()), [])
+        self.assertIsNone(load_transcript(None))
+        self.assertEqual(list(iter_transcript(os.path.join(self.tmp, "missing.jsonl"))), [])
+        self.assertEqual(load_transcript(self.tmp).path, os.path.join(self.tmp, "transcript.jsonl"))
+
+    def test_message_hash_ignores_key_order(self):
+        self.assertEqual(message_hash({"role": "user", "content": "hi"}), message_hash({"content": "hi", "role": "user"}))
+        self.assertNotEqual(message_hash({"role": "user", "content": "hi"}), message_hash({"role": "user", "content": "ho"}))
+
+
+class PromptBuilderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = PromptBuilder("gpt-5-nano", budget=300, flag_regex=r"flag\{\S+\}")
+        self.log = "\n".join(f"line {i}: some output from a tool" for i in range(2000))
+
+    def test_text_within_budget_is_unchanged(self):
+        self.assertEqual(self.builder.fit("short output", "tool"), "short output")
+        self.assertEqual(self.builder.elided_tokens, 0)
+
+    def test_fits_budget_and_marks_elisions(self):
+        fitted = self.builder.fit(self.log, "tool")
+        self.assertLessEqual(self.builder.count(fitted), 300)
+        self.assertIn("line 0:", fitted)
+        self.assertIn("line 1999:", fitted)
+        self.assertRegex(fitted, r"\[\.\.\. \d+ lines elided \.\.\.\]")
+        report = self.builder.report[-1]
+        self.assertEqual(report["label"], "tool")
+        self.assertEqual(report["elided_tokens"], report["original_tokens"] - report["kept_tokens"])
+        self.assertGreater(self.builder.elided_tokens, 0)
+
+    def test_keeps_flag_lines_with_context(self):
+        lines = self.log.splitlines()
+        lines[1000] = "line 1000: the flag is flag{kept_in_the_middle}"
+        fitted = self.builder.fit("\n".join(lines), "tool")
+        self.assertIn("flag{kept_in_the_middle}", fitted)
+        self.assertIn("line 999:", fitted)
+        self.assertIn("line 1001:", fitted)
+
+    def test_collapses_repeated_lines(self):
+        text = "\n".join(["header"] + ["same line again"] * 5000 + ["footer"])
+        fitted = self.builder.fit(text, "tool")
+        self.assertEqual(fitted, "header\nsame line again  [repeated 5000 times]\nfooter")
+
+    def test_structured_text_keeps_order_and_marks_every_removed_span(self):
+        source = "\n".join(f"def f{i}(x):\n    if x:\n        return {i}\n    else:\n        return None\n\n" for i in range(800))
+        original = source.splitlines()
+        fitted = self.builder.fit(source, "module.py").split("\n")
+        accounted, position = 0, 0
+        for line in fitted:
+            elided = re.fullmatch(r"\[\.\.\. (\d+) lines elided \.\.\.\]", line)
+            if elided:
+                accounted += int(elided.group(1))
+                position += int(elided.group(1))
+                continue
+            repeated = re.fullmatch(r"(.*)  \[repeated (\d+) times\]", line)
+            line, repeats = (repeated.group(1), int(repeated.group(2))) if repeated else (line, 1)
+            self.assertEqual(original[position:position + repeats], [line] * repeats)
+            accounted += repeats
+            position += repeats
+        self.assertEqual(accounted, len(original))
+        self.assertIn("def f0(x):", fitted)
+        self.assertIn("def f799(x):", fitted)
+        self.assertEqual(fitted[:5], original[:5])
+
+    def test_outputs_share_the_budget_and_duplicates_are_dropped(self):
+        fitted = self.builder.fit_outputs([self.log, self.log, "ls: done"], "discovery")
+        self.assertEqual(fitted.count("line 0:"), 1)
+        self.assertTrue(fitted.endswith("ls: done"))
+        self.assertLessEqual(self.builder.count(fitted), 300)
+        self.assertEqual([entry["label"] for entry in self.builder.report], ["discovery[0]", "discovery[1]"])
+
+    def test_binary_keeps_every_byte_escaped(self):
+        key = bytes([0x5a, 0xc3, 0x11, 0x9f])
+        data = b"\x7fELF\x02\x01" + b"\x00" * 512 + key + b"\x00\x01flag{in_binary}\xff"
+        text = bytes_to_text(data)
+        self.assertIn("00000000: \\x7fELF\\x02\\x01", text)
+        self.assertIn("* same as the line above", text)
+        self.assertIn("Z\\xc3\\x11\\x9f", text)
+        self.assertIn("flag{in_binary}", text)
+
+    def test_text_files_are_decoded(self):
+        self.assertEqual(bytes_to_text("plain text\nwith ünïcode\n".encode()), "plain text\nwith ünïcode\n")
+
+    def test_token_estimate_without_tiktoken(self):
+        with mock.patch('helper.prompt_builder.tiktoken', None):
+            self.assertEqual(count_tokens("x" * 400, "gpt-5-nano"), 101)
+            self.assertEqual(count_tokens("x" * 350, "claude-sonnet-4"), 101)
+
+
+if __name__ == '__main__':
+    unittest.main()